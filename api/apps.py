@@ -6,4 +6,5 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self) -> None:
-        import api.signals.handlers
\ No newline at end of file
+        import api.signals.handlers
+        import api.previews  # registers job handlers
\ No newline at end of file
@@ -0,0 +1,155 @@
+'''
+Async read only variants of patient and material endpoints for ASGI deployments (`SERVER=uvicorn`
+in deploy/entrypoint.sh). Queries run on Django's async ORM, so a worker keeps serving other
+requests while waiting for the database or for slow clients.
+Responses match page number responses of the DRF endpoints. Filtering, search, ordering
+and conditional GET stay on the DRF endpoints.
+'''
+import asyncio
+import weakref
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.models import Material, Patient
+from api.serializers import FullPatientSerializer, MaterialSerializer, PatientSerializer
+from core.authentication import StatelessJWTAuthentication
+
+
+authentication = StatelessJWTAuthentication()
+
+# Every request in flight holds its own database connection, so requests using database
+# are limited per worker with ASYNC_DB_CONCURRENCY, others wait in the event loop
+db_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_db_semaphore():
+    loop = asyncio.get_running_loop()
+    if loop not in db_semaphores:
+        db_semaphores[loop] = asyncio.Semaphore(settings.ASYNC_DB_CONCURRENCY)
+    return db_semaphores[loop]
+
+
+def close_connections():
+    '''
+    Closes connections of current request before its slot is released. Django would close them
+    only after the response is sent, which takes long for slow clients.
+    '''
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+
+def api_response(data, status=status.HTTP_200_OK, headers=None):
+    return JsonResponse(data, status=status, headers=headers, encoder=JSONEncoder, safe=False)
+
+
+async def authenticate(request):
+    '''
+    Returns user of request's JWT or raises NotAuthenticated.
+    Token is verified in the event loop, user lookup (if any) runs in a thread.
+    '''
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        raise NotAuthenticated()
+    validated_token = authentication.get_validated_token(raw_token)
+    return await sync_to_async(authentication.get_user)(validated_token)
+
+
+def async_api_view(view):
+    '''
+    Authenticates GET requests, limits concurrent database work and renders API exceptions like DRF does.
+    '''
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return api_response({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+        try:
+            async with get_db_semaphore():
+                try:
+                    request.user = await authenticate(request)
+                    return await view(request, *args, **kwargs)
+                finally:
+                    await sync_to_async(close_connections)()
+        except APIException as exc:
+            headers = None
+            if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                headers = {'WWW-Authenticate': authentication.authenticate_header(request)}
+            return api_response({'detail': exc.detail}, exc.status_code, headers)
+    return wrapper
+
+
+async def paginate(request, queryset, serializer_class):
+    '''
+    Async counterpart of PageNumberPagination with PAGE_SIZE setting.
+    '''
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    try:
+        page = int(request.GET.get('page', 1))
+        if page < 1:
+            raise ValueError
+    except ValueError:
+        raise NotFound('Invalid page.')
+
+    count = await queryset.acount()
+    if page > 1 and (page - 1) * page_size >= count:
+        raise NotFound('Invalid page.')
+
+    offset = (page - 1) * page_size
+    instances = [instance async for instance in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    return {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if offset + page_size < count else None,
+        'previous': (
+            None if page == 1
+            else remove_query_param(url, 'page') if page == 2
+            else replace_query_param(url, 'page', page - 1)
+        ),
+        'results': serializer_class(instances, many=True, context={'request': request}).data,
+    }
+
+
+def get_patient_queryset(user):
+    queryset = Patient.objects.defer('search_vector')
+    if not user.is_staff:
+        return queryset.filter(doctor_id=user.profile_id)
+    return queryset.select_related('doctor', 'doctor__user')
+
+
+def get_patient_serializer_class(user):
+    return FullPatientSerializer if user.is_staff else PatientSerializer
+
+
+@async_api_view
+async def patient_list(request):
+    queryset = get_patient_queryset(request.user)
+    return api_response(await paginate(request, queryset, get_patient_serializer_class(request.user)))
+
+
+@async_api_view
+async def patient_detail(request, pk):
+    try:
+        patient = await get_patient_queryset(request.user).aget(pk=pk)
+    except Patient.DoesNotExist:
+        raise NotFound()
+    serializer = get_patient_serializer_class(request.user)(patient, context={'request': request})
+    return api_response(serializer.data)
+
+
+@async_api_view
+async def material_list(request, patient_pk):
+    patients = Patient.objects.filter(pk=patient_pk)
+    if not request.user.is_staff:
+        patients = patients.filter(doctor_id=request.user.profile_id)
+    if not await patients.aexists():
+        raise NotFound('Patient not found')
+    return api_response(await paginate(request, Material.objects.filter(patient_id=patient_pk), MaterialSerializer))
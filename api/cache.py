@@ -0,0 +1,99 @@
+'''
+Per doctor cache of patient list responses.
+
+Entries are keyed by scope (doctor profile id, or staff for admins) and request,
+and stored under the scope's version number. Any change of doctor's patients or
+materials bumps the version, so stale entries are never read again and just expire.
+
+Hit and miss counters are kept in memory of each worker process, a cache write per
+request would cost more than a cached read saves.
+'''
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+STAFF_SCOPE = 'staff'
+stats = Counter()
+stats_lock = threading.Lock()
+
+
+def get_scope(user):
+    return STAFF_SCOPE if user.is_staff else user.profile_id
+
+
+def get_request_key(request, serializer_class):
+    key = '|'.join([request.get_full_path(), request.accepted_media_type, serializer_class.__name__])
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def get_version(scope):
+    key = f'patient-list:version:{scope}'
+    version = cache.get(key)
+    if version is None:
+        # Time based start never repeats versions of entries which outlived evicted version key
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(scopes):
+    for scope in scopes:
+        try:
+            cache.incr(f'patient-list:version:{scope}')
+        except ValueError:
+            get_version(scope)
+
+
+def invalidate(*doctor_ids):
+    '''
+    Bumps versions of given doctors and of staff scope, which includes every doctor.
+    Bumped now for reads inside current transaction and again after commit, dropping
+    pages cached meanwhile by other requests from not yet committed state.
+    '''
+    scopes = {*doctor_ids, STAFF_SCOPE}
+    bump_versions(scopes)
+    transaction.on_commit(lambda: bump_versions(scopes))
+
+
+def count(key):
+    with stats_lock:
+        stats[key] += 1
+
+
+def get(scope, request_key):
+    '''
+    Returns (cached value or None, version). On miss the value must be stored with
+    the returned version, read before querying, so changes made meanwhile are not hidden.
+    '''
+    version = get_version(scope)
+    value = cache.get(f'patient-list:{scope}:{request_key}', version=version)
+    count('misses' if value is None else 'hits')
+    return value, version
+
+
+def set(scope, request_key, value, version):
+    cache.set(
+        f'patient-list:{scope}:{request_key}',
+        value,
+        timeout=settings.PATIENT_LIST_CACHE_TIMEOUT,
+        version=version,
+    )
+
+
+def get_stats():
+    '''
+    Returns hit and miss counts of the current worker process since it started.
+    '''
+    with stats_lock:
+        hits, misses = stats['hits'], stats['misses']
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    }
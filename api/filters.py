@@ -0,0 +1,36 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from django.template import loader
+from rest_framework.filters import SearchFilter
+
+
+class FullTextSearchFilter(SearchFilter):
+    '''
+    Drop-in replacement of SearchFilter backed by PostgreSQL full text search.
+    Matches `?search=` terms against view's `search_vector_field` and orders results by rank.
+    '''
+    search_config = 'english'
+
+    def filter_queryset(self, request, queryset, view):
+        search_vector_field = getattr(view, 'search_vector_field', None)
+        search_terms = self.get_search_terms(request)
+
+        if not search_vector_field or not search_terms:
+            return queryset
+
+        query = SearchQuery(' '.join(search_terms), config=self.search_config, search_type='websearch')
+        return queryset.filter(**{search_vector_field: query}).annotate(
+            search_rank=SearchRank(F(search_vector_field), query)
+        ).order_by('-search_rank', 'id')
+
+    def to_html(self, request, queryset, view):
+        if not getattr(view, 'search_vector_field', None):
+            return ''
+
+        term = self.get_search_terms(request)
+        context = {
+            'param': self.search_param,
+            'term': term[0] if term else '',
+        }
+        template = loader.get_template(self.template)
+        return template.render(context)
@@ -0,0 +1,78 @@
+'''
+Database backed job queue, no broker required. Jobs are rows of api_job inserted
+in the transaction of the change that needs them, so they are never lost nor run early.
+Workers (`manage.py run_jobs`) claim jobs with SELECT ... FOR UPDATE SKIP LOCKED and keep
+the row locked while running it, a crashed worker leaves its job pending for others.
+'''
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import Job
+
+
+logger = logging.getLogger(__name__)
+
+handlers = {}
+
+
+def register(name, on_failure=None):
+    '''
+    Registers decorated function as handler of jobs named `name`, called with payload as kwargs.
+    `on_failure` is called with the same kwargs when last attempt fails.
+    '''
+    def decorator(func):
+        handlers[name] = (func, on_failure)
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    return Job.objects.create(name=name, payload=payload)
+
+
+def get_retry_delay(attempts):
+    return timedelta(seconds=settings.JOB_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def run_next():
+    '''
+    Runs one due job. Returns False if no job is due.
+    '''
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.StatusChoice.PENDING, run_after__lte=timezone.now())
+            .first()
+        )
+        if job is None:
+            return False
+
+        if job.name not in handlers:
+            job.status = Job.StatusChoice.FAILED
+            job.last_error = f'No handler is registered for {job.name} jobs.'
+            job.save()
+            return True
+
+        handler, on_failure = handlers[job.name]
+        job.attempts += 1
+        try:
+            with transaction.atomic():
+                handler(**job.payload)
+        except Exception:
+            logger.exception('Job %s %s failed', job.id, job)
+            job.last_error = traceback.format_exc()
+            if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+                job.status = Job.StatusChoice.FAILED
+                if on_failure is not None:
+                    on_failure(**job.payload)
+            else:
+                job.run_after = timezone.now() + get_retry_delay(job.attempts)
+            job.save()
+        else:
+            job.delete()
+    return True
@@ -0,0 +1,159 @@
+import csv
+import io
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from api import cache as patient_list_cache
+from api.models import Patient, Profile
+from api.serializers import CreatePatientSerializer
+
+
+COPY_COLUMNS = [
+    'first_name', 'last_name', 'birth_date', 'gender', 'med_condition', 'doctor_id', 'created', 'updated', 'materials_count',
+]
+# Empty CSV cells of these columns are imported as NULL
+NULLABLE_FIELDS = ['birth_date', 'gender']
+
+
+def as_messages(detail):
+    return {field: [str(message) for message in messages] for field, messages in detail.items()}
+
+
+def validate_chunk(rows, doctor_id, timestamp):
+    '''
+    Validates rows with CreatePatientSerializer rules and encodes valid ones as CSV for COPY.
+    Returns (csv text, row count, [(row index, errors)], {doctor id: first row index}).
+    Runs in worker processes, so the database is not touched here.
+    '''
+    serializer = CreatePatientSerializer()
+    # Doctors are checked by the caller with one query per chunk
+    del serializer.fields['doctor']
+    doctor_field = serializers.IntegerField(min_value=1)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    errors = []
+    doctor_ids = {}
+
+    for index, row in enumerate(rows):
+        row = {field: (value or None) if field in NULLABLE_FIELDS else value for field, value in row.items()}
+        try:
+            data = serializer.run_validation(row)
+        except serializers.ValidationError as exc:
+            errors.append((index, as_messages(exc.detail)))
+            continue
+
+        row_doctor_id = doctor_id
+        if row_doctor_id is None:
+            try:
+                row_doctor_id = doctor_field.run_validation(row.get('doctor'))
+            except serializers.ValidationError as exc:
+                errors.append((index, {'doctor': [str(message) for message in exc.detail]}))
+                continue
+        doctor_ids.setdefault(row_doctor_id, index)
+
+        writer.writerow([
+            data['first_name'],
+            data['last_name'],
+            data.get('birth_date') or '',
+            data.get('gender') or '',
+            data['med_condition'],
+            row_doctor_id,
+            timestamp,
+            timestamp,
+            # New patients have no materials, column has no database default
+            0,
+        ])
+
+    return buffer.getvalue(), len(rows), errors, doctor_ids
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports patients from CSV file using PostgreSQL COPY. '
+        'Header must contain first_name, last_name, birth_date, gender, med_condition '
+        'and doctor (profile id) unless --doctor is given. '
+        'Every chunk is committed separately, failed import is resumed with --skip.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='path to CSV file')
+        parser.add_argument('--doctor', type=int, help='profile id of doctor for all rows')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='rows validated and copied at once')
+        parser.add_argument('--workers', type=int, default=1, help='processes validating chunks in parallel')
+        parser.add_argument('--skip', type=int, default=0, help='number of data rows to skip, e.g. to resume failed import')
+
+    def handle(self, *args, **options):
+        doctor_id = options['doctor']
+        if doctor_id is not None and not Profile.objects.filter(id=doctor_id).exists():
+            raise CommandError(f'Doctor profile {doctor_id} does not exist.')
+
+        imported = options['skip']
+        started = time.monotonic()
+        timestamp = timezone.now().isoformat()
+
+        with open(options['path'], newline='', encoding='utf-8') as file:
+            rows = itertools.islice(csv.DictReader(file), imported, None)
+            chunks = iter(lambda: list(itertools.islice(rows, options['chunk_size'])), [])
+
+            for data, count, errors, doctor_ids in self.validate(chunks, options['workers'], doctor_id, timestamp):
+                errors += self.check_doctors(doctor_ids)
+                if errors:
+                    for index, detail in sorted(errors, key=lambda error: error[0]):
+                        self.stderr.write(f'Row {imported + index + 1}: {detail}')
+                    raise CommandError(
+                        f'Import stopped, {imported} rows are imported. '
+                        f'Fix the rows above and resume with --skip {imported}.'
+                    )
+
+                self.copy(data)
+                patient_list_cache.invalidate(*doctor_ids)
+                imported += count
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{imported} rows imported, {(imported - options["skip"]) / elapsed:.0f} rows/s')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {imported - options["skip"]} rows in {time.monotonic() - started:.1f}s'
+        ))
+
+    def validate(self, chunks, workers, doctor_id, timestamp):
+        '''
+        Yields validate_chunk results in input order. With several workers at most
+        two chunks per worker are in flight, so the file is never loaded entirely.
+        '''
+        if workers <= 1:
+            for chunk in chunks:
+                yield validate_chunk(chunk, doctor_id, timestamp)
+            return
+
+        # Forked workers must not share database connections of this process
+        connections.close_all()
+        with ProcessPoolExecutor(workers) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(validate_chunk, chunk, doctor_id, timestamp))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def check_doctors(self, doctor_ids):
+        existing = set(Profile.objects.filter(id__in=doctor_ids).values_list('id', flat=True))
+        return [
+            (index, {'doctor': [f'Invalid pk "{pk}" - object does not exist.']})
+            for pk, index in doctor_ids.items() if pk not in existing
+        ]
+
+    def copy(self, data):
+        columns = ', '.join(COPY_COLUMNS)
+        nullable = ', '.join(NULLABLE_FIELDS)
+        sql = f'COPY {Patient._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv, FORCE_NULL ({nullable}))'
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.copy_expert(sql, io.StringIO(data))
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import MaterialUpload
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes unfinished material uploads started more than MATERIAL_UPLOAD_EXPIRY_HOURS ago '
+        'and their part files. Run it daily, e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=settings.MATERIAL_UPLOAD_EXPIRY_HOURS, help='hours to keep uploads'
+        )
+        parser.add_argument('--batch-size', type=int, default=100, help='uploads deleted in one transaction')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                # Uploads being finalized are locked, they are left for a later run
+                uploads = list(
+                    MaterialUpload.objects.select_for_update(skip_locked=True)
+                    .filter(created__lt=cutoff)
+                    .order_by()[:options['batch_size']]
+                )
+                if not uploads:
+                    break
+                # Part files are deleted after commit by the post_delete handler
+                deleted += MaterialUpload.objects.filter(id__in=[upload.id for upload in uploads]).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {deleted} uploads deleted'))
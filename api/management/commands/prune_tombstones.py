@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes tombstones older than the retention period (TOMBSTONE_RETENTION_DAYS). '
+        'Sync clients with older watermarks have to sync from the beginning. Run it daily, e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.TOMBSTONE_RETENTION_DAYS, help='days to keep tombstones'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='tombstones deleted in one statement')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted = 0
+        while True:
+            # Batches keep deleting transactions and their locks short
+            ids = list(
+                Tombstone.objects.filter(deleted__lt=cutoff)
+                .order_by()
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            deleted += Tombstone.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {deleted} tombstones deleted'))
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from api import cache as patient_list_cache
+from api.models import Material, Patient
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes materials_count and last_material_at of patients from their materials '
+        'and fixes the patients that drifted, e.g. after raw SQL changes of materials.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='patients checked in one transaction')
+
+    def handle(self, *args, **options):
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                # Locked patients wait for concurrent material changes, which update them too
+                patients = list(
+                    Patient.objects.select_for_update()
+                    .filter(id__gt=last_id)
+                    .order_by('id')
+                    .values_list('id', 'doctor_id', 'materials_count', 'last_material_at')[:options['batch_size']]
+                )
+                if not patients:
+                    break
+                last_id = patients[-1][0]
+                fixed += self.fix_batch(patients)
+                checked += len(patients)
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {checked} patients checked, {fixed} fixed'))
+
+    def fix_batch(self, patients):
+        stats = {
+            patient_id: (count, last_created)
+            for patient_id, count, last_created in Material.objects.filter(patient_id__in=[row[0] for row in patients])
+            .order_by()
+            .values('patient_id')
+            .annotate(count=Count('id'), last_created=Max('created'))
+            .values_list('patient_id', 'count', 'last_created')
+        }
+        fixed = 0
+        doctor_ids = set()
+        for patient_id, doctor_id, materials_count, last_material_at in patients:
+            count, last_created = stats.get(patient_id, (0, None))
+            if (materials_count, last_material_at) != (count, last_created):
+                Patient.objects.filter(id=patient_id).update(
+                    materials_count=count,
+                    last_material_at=last_created,
+                    updated=timezone.now(),
+                )
+                fixed += 1
+                doctor_ids.add(doctor_id)
+        patient_list_cache.invalidate(*doctor_ids)
+        return fixed
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api import jobs
+
+
+def close_old_connections():
+    # Like Django does between requests, a lost database connection is reopened by the next job
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+
+class Command(BaseCommand):
+    help = 'Runs background jobs (api.jobs) until stopped. Start as many workers as needed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='exit when no job is due')
+        parser.add_argument('--poll-interval', type=float, default=2, help='seconds to wait when no job is due')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            if jobs.run_next():
+                continue
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_alter_material_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['doctor', 'updated', 'id'], name='api_patient_doctor_updated_idx'),
+        ),
+    ]
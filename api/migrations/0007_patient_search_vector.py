@@ -0,0 +1,53 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_VECTOR_SQL = '''
+    setweight(to_tsvector('english', coalesce({row}first_name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}last_name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}med_condition, '')), 'B')
+'''
+
+# Trigger keeps search_vector current on every write path: save(), bulk_create(), update() and COPY
+CREATE_TRIGGER_SQL = f'''
+CREATE FUNCTION api_patient_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_patient_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF first_name, last_name, med_condition ON api_patient
+    FOR EACH ROW EXECUTE FUNCTION api_patient_search_vector_update();
+
+UPDATE api_patient SET search_vector = {SEARCH_VECTOR_SQL.format(row='')};
+'''
+
+DROP_TRIGGER_SQL = '''
+DROP TRIGGER IF EXISTS api_patient_search_vector_trigger ON api_patient;
+DROP FUNCTION IF EXISTS api_patient_search_vector_update();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_patient_api_patient_doctor_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='api_patient_search_gin_idx'),
+        ),
+    ]
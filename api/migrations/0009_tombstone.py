@@ -0,0 +1,28 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_patient_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('patient', 'Patient'), ('material', 'Material')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('patient_id', models.BigIntegerField()),
+                ('doctor_id', models.BigIntegerField()),
+                ('deleted', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['deleted', 'id'],
+                'indexes': [models.Index(fields=['doctor_id', 'deleted'], name='api_tombstone_doctor_idx')],
+            },
+        ),
+    ]
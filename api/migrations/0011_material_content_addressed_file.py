@@ -0,0 +1,33 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:05
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_materialupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='material',
+            name='name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        # Files stored before keep their names, which are their original file names
+        migrations.RunSQL(
+            "UPDATE api_material SET name = regexp_replace(file, '^.*/', '') WHERE name = ''",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='material',
+            name='file',
+            field=models.FileField(storage=api.storage.get_material_storage, upload_to=''),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['file'], name='api_material_file_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:07
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_material_content_addressed_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='material',
+            name='preview_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('unsupported', 'Unsupported'), ('failed', 'Failed')], default='pending', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='material',
+            name='thumbnail',
+            field=models.FileField(blank=True, upload_to='thumbnails/'),
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['run_after', 'id'], name='api_job_pending_idx')],
+            },
+        ),
+        # Previews of existing materials are generated by workers too
+        migrations.RunSQL(
+            '''
+            INSERT INTO api_job (name, payload, status, attempts, run_after, last_error, created)
+            SELECT 'material_preview', jsonb_build_object('material_id', id), 'pending', 0, now(), '', now()
+            FROM api_material
+            ''',
+            migrations.RunSQL.noop,
+        ),
+    ]
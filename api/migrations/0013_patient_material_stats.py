@@ -0,0 +1,36 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_material_preview_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='last_material_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='materials_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            '''
+            UPDATE api_patient
+            SET materials_count = stats.count, last_material_at = stats.last_created
+            FROM (
+                SELECT patient_id, count(*) AS count, max(created) AS last_created
+                FROM api_material
+                GROUP BY patient_id
+            ) AS stats
+            WHERE api_patient.id = stats.patient_id
+            ''',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,229 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from api.compiled import compile_serializer
+from api.models import Patient
+from api.pagination import PatientPagination
+
+
+class ConditionalGetMixin:
+    '''
+    Answers list and retrieve with 304 Not Modified when client's ETag or Last-Modified is current.
+    Validators are read before anything is serialized: list reads max `updated` and count of
+    the filtered rows in one aggregate (page number pagination reuses the count), keyset pages
+    read (id, updated) of their window. Retrieve reads `updated` of the object.
+    Changes of related objects that do not touch `updated` are not detected.
+    '''
+    last_modified_field = 'updated'
+    list_count = None
+
+    def get_keyset_paginator(self):
+        '''
+        Returns new paginator of the request if list is paginated by keyset, otherwise None.
+        '''
+        paginator = self.paginator
+        if isinstance(paginator, PatientPagination) and paginator.is_keyset(self.request):
+            paginator = paginator.cursor_pagination_class()
+        return type(paginator)() if isinstance(paginator, CursorPagination) else None
+
+    def get_list_validators(self, request):
+        '''
+        Returns (last modified, validators) of the rows list would render.
+        '''
+        queryset = self.filter_queryset(self.get_queryset())
+        keyset_paginator = self.get_keyset_paginator()
+        if keyset_paginator is not None:
+            pk_name = queryset.model._meta.pk.attname
+            window = keyset_paginator.paginate_queryset(
+                queryset.values(pk_name, self.last_modified_field), request, view=self
+            )
+            last_modified = max((row[self.last_modified_field] for row in window), default=None)
+            ids = ','.join(str(row[pk_name]) for row in window)
+            return last_modified, (ids, keyset_paginator.has_next, keyset_paginator.has_previous)
+
+        aggregate = queryset.order_by().aggregate(last_modified=Max(self.last_modified_field), count=Count('pk'))
+        self.list_count = aggregate['count']
+        return aggregate['last_modified'], (aggregate['count'],)
+
+    def list(self, request, *args, **kwargs):
+        last_modified, validators = self.get_list_validators(request)
+        return self.conditional_response(
+            request,
+            self.get_etag(request, last_modified, *validators),
+            self.get_timestamp(last_modified),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            last_modified = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            ).values_list(self.last_modified_field, flat=True).first()
+        except (TypeError, ValueError, ValidationError):
+            last_modified = None
+
+        if last_modified is None:
+            # Let retrieve answer with 404
+            return super().retrieve(request, *args, **kwargs)
+
+        return self.conditional_response(
+            request,
+            self.get_etag(request, last_modified, kwargs[lookup_url_kwarg]),
+            self.get_timestamp(last_modified),
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+    def get_etag(self, request, last_modified, *validators):
+        # Representation also depends on user, query params, negotiated format and serializer
+        key = '|'.join(str(part) for part in (
+            request.user.pk,
+            request.get_full_path(),
+            request.accepted_media_type,
+            self.get_serializer_class().__name__,
+            last_modified.isoformat() if last_modified else '',
+            *validators,
+        ))
+        return quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+
+    def get_timestamp(self, last_modified):
+        return int(last_modified.timestamp()) if last_modified else None
+
+    def conditional_response(self, request, etag, timestamp, get_response):
+        '''
+        Returns 304 response if validators match request's conditions, otherwise response of get_response.
+        '''
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = get_response()
+
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            # Responses are per user and must be revalidated before reuse
+            patch_vary_headers(response, ['Authorization'])
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class ParentPatientMixin:
+    '''
+    For views nested under `patients/{patient_pk}/` with models linked to `patient`.
+    Scopes queryset to parent patient of the user and fetches parent patient at most once per request.
+    '''
+    parent_patient = None
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = super().get_queryset().filter(patient_id=self.kwargs['patient_pk'])
+        if not user.is_staff and self.parent_patient is None:
+            # Ownership is checked in the same query
+            queryset = queryset.filter(patient__doctor_id=user.profile_id)
+        return queryset
+
+    def get_parent_patient(self) -> Patient:
+        '''
+        Returns parent patient, fetched once per request with its ownership check.
+        Raises 404 if parent patient does not exist or is not relative for non admin user.
+        '''
+        if self.parent_patient is None:
+            user = self.request.user
+            queryset = Patient.objects.only('id', 'doctor_id')
+            if not user.is_staff:
+                queryset = queryset.filter(doctor_id=user.profile_id)
+            try:
+                self.parent_patient = queryset.get(id=self.kwargs['patient_pk'])
+            except (Patient.DoesNotExist, TypeError, ValueError):
+                raise NotFound('Patient not found')
+        return self.parent_patient
+
+
+class SparseFieldsetMixin:
+    '''
+    Renders only fields listed in `?fields=` of GET requests, comma separated with dotted names
+    for nested fields (e.g. `?fields=id,first_name,doctor.full_name`), and loads only their columns:
+    queryset gets only() and select_related() of the relations rendered fields reach.
+    Serializer classes must use SparseFieldsetSerializerMixin.
+    '''
+    fields_query_param = 'fields'
+    # Loaded even if not rendered, e.g. fields read by pagination
+    sparse_fieldset_required = ()
+
+    def get_requested_fields(self):
+        request = self.request
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        value = request.query_params.get(self.fields_query_param, '')
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        return fields or None
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+
+        paths = self.get_serializer_class()(fields=fields).get_query_fields()
+        if paths is None:
+            return queryset
+        relations = set()
+        for path in paths:
+            parts = path.split('__')[:-1]
+            relations.update('__'.join(parts[:index]) for index in range(1, len(parts) + 1))
+        queryset = queryset.select_related(None)
+        if relations:
+            # Without arguments select_related() would follow all relations
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*paths, *relations, *self.sparse_fieldset_required)
+
+
+class CompiledReadMixin:
+    '''
+    Serves list and retrieve with serializer compiled by api.compiled over values() rows,
+    regular serialization is used when the serializer can not be compiled.
+    Requested fields come from SparseFieldsetMixin.
+    '''
+
+    def get_compiled_serializer(self):
+        fields = self.get_requested_fields()
+        return compile_serializer(self.get_serializer_class(), tuple(fields) if fields else None)
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # Keyset pagination reads its ordering fields from rows
+        queryset = compiled.values(queryset, queryset.model._meta.pk.name, *self.sparse_fieldset_required)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.render(page))
+        return Response(compiled.render(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = compiled.values(self.filter_queryset(self.get_queryset()))
+        row = get_object_or_404(queryset, **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(compiled.render_one(row))
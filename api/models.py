@@ -1,6 +1,15 @@
-from django.db import models
+import os
+
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
 from django.conf import settings
 
+from api.storage import get_material_storage
+
 
 class Profile(models.Model):
     company_name = models.CharField(max_length=255)
@@ -24,23 +33,168 @@ class Patient(models.Model):
     doctor = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='patients')
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # Maintained by database trigger from names and med_condition, see migration 0007
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Maintained on material changes by api.signals.handlers, repaired by `manage.py recompute_material_stats`
+    materials_count = models.PositiveIntegerField(default=0, editable=False)
+    last_material_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['updated', 'first_name', 'last_name']
+        indexes = [
+            # Serves keyset pagination and per doctor listing ordered by (updated, id)
+            models.Index(fields=['doctor', 'updated', 'id'], name='api_patient_doctor_updated_idx'),
+            GinIndex(fields=['search_vector'], name='api_patient_search_gin_idx'),
+            # Trigram indexes serve case insensitive LIKE lookups on names, e.g. istartswith
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='api_patient_first_name_trgm'),
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='api_patient_last_name_trgm'),
+        ]
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered to invalidate previous doctor's cached lists when patient is reassigned
+        instance._loaded_doctor_id = instance.__dict__.get('doctor_id')
+        return instance
+
 
 class Material(models.Model):
-    file = models.FileField()
+    class PreviewStatusChoice(models.TextChoices):
+        PENDING = 'pending'
+        READY = 'ready'
+        UNSUPPORTED = 'unsupported'
+        FAILED = 'failed'
+
+    # Deduplicated by content, original file name is kept in `name`
+    file = models.FileField(storage=get_material_storage)
+    name = models.CharField(max_length=255, blank=True)
+    # Generated in background by `material_preview` job (see api.previews)
+    thumbnail = models.FileField(upload_to='thumbnails/', blank=True)
+    preview_status = models.CharField(
+        max_length=16,
+        choices=PreviewStatusChoice.choices,
+        default=PreviewStatusChoice.PENDING,
+    )
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['updated', 'created']
+        indexes = [
+            # References of a blob are counted before it is deleted
+            models.Index(fields=['file'], name='api_material_file_idx'),
+        ]
+
+    def __str__(self):
+        return self.name or self.file.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered to release previous blob when file is replaced
+        instance._loaded_file_name = instance.__dict__.get('file')
+        # Remembered to move material stats when material is reassigned
+        instance._loaded_patient_id = instance.__dict__.get('patient_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            self.name = os.path.basename(self.file.name)
+        # New file gets new preview, job is enqueued by post_save handler
+        self._preview_requested = bool(self.file) and (
+            not self.file._committed or self.file.name != getattr(self, '_loaded_file_name', None)
+        )
+        if self._preview_requested:
+            self.preview_status = self.PreviewStatusChoice.PENDING
+        # Patient stats and preview job of post_save handlers are committed with the material
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
 
 
+class MaterialUpload(models.Model):
+    '''
+    Resumable upload of a material file in chunks of `chunk_size` bytes.
+    Chunks are written in place into a preallocated part file in media storage,
+    the finalized file is moved next to other material files.
+    '''
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    chunk_size = models.PositiveIntegerField()
+    received_chunks = ArrayField(models.PositiveIntegerField(), default=list, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created']
+
     def __str__(self):
-        return self.file.name
+        return self.filename
+
+    @property
+    def part_name(self):
+        return f'uploads/{self.id}.part'
+
+    @property
+    def chunks_count(self):
+        return -(-self.size // self.chunk_size)
+
+    def get_chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+
+class Job(models.Model):
+    '''
+    Task of the database backed job queue, run by `manage.py run_jobs` workers (see api.jobs).
+    Finished jobs are deleted, failed ones are kept for inspection.
+    '''
+    class StatusChoice(models.TextChoices):
+        PENDING = 'pending'
+        FAILED = 'failed'
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=StatusChoice.choices, default=StatusChoice.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(
+                fields=['run_after', 'id'],
+                condition=models.Q(status='pending'),
+                name='api_job_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} {self.payload}'
+
+
+class Tombstone(models.Model):
+    '''
+    Record of deleted patient or material for delta sync clients.
+    Relations are stored as plain ids, the referenced rows no longer exist.
+    '''
+    class ModelChoice(models.TextChoices):
+        PATIENT = 'patient'
+        MATERIAL = 'material'
+
+    model = models.CharField(max_length=16, choices=ModelChoice.choices)
+    object_id = models.BigIntegerField()
+    patient_id = models.BigIntegerField()
+    doctor_id = models.BigIntegerField()
+    deleted = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['deleted', 'id']
+        indexes = [
+            models.Index(fields=['doctor_id', 'deleted'], name='api_tombstone_doctor_idx'),
+        ]
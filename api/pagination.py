@@ -0,0 +1,72 @@
+from functools import partial
+
+from django.core.paginator import Paginator
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CountedPaginator(Paginator):
+    '''
+    Django paginator taking the number of rows when it is already known, instead of counting them again.
+    '''
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+
+class CountedPageNumberPagination(PageNumberPagination):
+    '''
+    Page number pagination reusing `list_count` of the view, set by views which have counted the rows.
+    '''
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(CountedPaginator, count=getattr(view, 'list_count', None))
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(CursorPagination):
+    '''
+    Cursor pagination seeking on (updated, id).
+    Pages cost the same at any depth and no count query is issued.
+    `ordering` query param is ignored, keyset order must match the index.
+    '''
+    ordering = ('updated', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+    def decode_cursor(self, request):
+        # Empty `?cursor=` requests the first page in cursor mode
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+
+class PatientPagination(CountedPageNumberPagination):
+    '''
+    Page number pagination by default.
+    Switches to keyset pagination when `cursor` query param is present (`?cursor=` for the first page).
+    '''
+    cursor_pagination_class = KeysetPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def is_keyset(self, request):
+        return self.cursor_pagination_class.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_keyset(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        cursor_parameters = self.cursor_pagination_class().get_schema_operation_parameters(view)
+        return super().get_schema_operation_parameters(view) + cursor_parameters
@@ -0,0 +1,94 @@
+'''
+Thumbnails of material files, generated by `material_preview` jobs.
+Images are downscaled with Pillow, first pages of PDF files are rendered with pdftoppm (poppler-utils).
+'''
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, UnidentifiedImageError
+
+from api import jobs
+from api.models import Material
+
+
+PDF_SIGNATURE = b'%PDF-'
+
+
+class UnsupportedFile(Exception):
+    pass
+
+
+def make_thumbnail(image):
+    '''
+    Returns JPEG bytes of image fitted into MATERIAL_THUMBNAIL_SIZE square.
+    '''
+    image.thumbnail((settings.MATERIAL_THUMBNAIL_SIZE, settings.MATERIAL_THUMBNAIL_SIZE))
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def render_pdf_first_page(path):
+    '''
+    Returns first page of PDF at path as Pillow image.
+    '''
+    if shutil.which('pdftoppm') is None:
+        raise UnsupportedFile('pdftoppm is not installed')
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, 'page')
+        subprocess.run(
+            ['pdftoppm', '-jpeg', '-singlefile', '-f', '1', '-l', '1',
+             '-scale-to', str(settings.MATERIAL_THUMBNAIL_SIZE * 2), path, output],
+            check=True,
+            capture_output=True,
+            timeout=settings.MATERIAL_PREVIEW_TIMEOUT,
+        )
+        with Image.open(f'{output}.jpg') as image:
+            image.load()
+            return image
+
+
+def get_preview_image(material):
+    path = material.file.path
+    with open(path, 'rb') as file:
+        is_pdf = file.read(len(PDF_SIGNATURE)) == PDF_SIGNATURE
+    if is_pdf:
+        return render_pdf_first_page(path)
+    try:
+        with Image.open(path) as image:
+            # Decoding is limited to the size needed by thumbnail
+            image.draft('RGB', (settings.MATERIAL_THUMBNAIL_SIZE, settings.MATERIAL_THUMBNAIL_SIZE))
+            image.load()
+            return image
+    except UnidentifiedImageError:
+        raise UnsupportedFile(material.name)
+
+
+def mark_preview_failed(material_id):
+    Material.objects.filter(id=material_id).update(preview_status=Material.PreviewStatusChoice.FAILED)
+
+
+@jobs.register('material_preview', on_failure=mark_preview_failed)
+def generate_material_preview(material_id):
+    material = Material.objects.filter(id=material_id).first()
+    # Deleted materials or replaced files have nothing or another job to do
+    if material is None or material.preview_status != Material.PreviewStatusChoice.PENDING:
+        return
+
+    try:
+        thumbnail = make_thumbnail(get_preview_image(material))
+    except UnsupportedFile:
+        material.preview_status = Material.PreviewStatusChoice.UNSUPPORTED
+        material.save(update_fields=['preview_status', 'updated'])
+        return
+
+    if material.thumbnail:
+        material.thumbnail.delete(save=False)
+    material.thumbnail.save(f'{material.id}.jpg', ContentFile(thumbnail), save=False)
+    material.preview_status = Material.PreviewStatusChoice.READY
+    material.save(update_fields=['thumbnail', 'preview_status', 'updated'])
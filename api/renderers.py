@@ -0,0 +1,139 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+json_encoder = JSONEncoder()
+
+
+def encode_default(obj):
+    '''
+    Encodes types without native support of orjson or msgpack the way DRF's JSONEncoder does.
+    '''
+    return json_encoder.default(obj)
+
+
+def orjson_dumps(data):
+    # Z suffix of UTC datetimes and str() of non str keys match DRF's JSONEncoder
+    return orjson.dumps(data, default=encode_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONRenderer(JSONRenderer):
+    '''
+    JSONRenderer encoding with orjson when it is installed. Dates and times are encoded natively,
+    other types like DRF's JSONEncoder does, so output is the same.
+    Indented output (e.g. `Accept: application/json; indent=4`) falls back to JSONRenderer.
+    '''
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson_dumps(data)
+        # Escaped by JSONRenderer for embedding into JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    '''
+    MessagePack responses for `Accept: application/msgpack` (requires msgpack).
+    Values are the same as in JSON responses, e.g. datetimes are ISO 8601 strings.
+    '''
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class StreamingRenderer(BaseRenderer):
+    '''
+    Base for line oriented renderers.
+    `render` handles regular response data (e.g. errors), `stream` encodes rows lazily
+    yielding one bytes chunk per `batch_size` rows.
+    '''
+    charset = 'utf-8'
+    batch_size = 500
+
+    def encode_header(self, fields):
+        return ''
+
+    def encode_row(self, row, fields):
+        raise NotImplementedError('.encode_row() must be implemented.')
+
+    def stream(self, rows, fields):
+        lines = [self.encode_header(fields)]
+        for row in rows:
+            lines.append(self.encode_row(row, fields))
+            if len(lines) >= self.batch_size:
+                yield ''.join(lines).encode(self.charset)
+                lines = []
+        if lines:
+            yield ''.join(lines).encode(self.charset)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        fields = list(rows[0].keys()) if rows and isinstance(rows[0], dict) else []
+        return b''.join(self.stream(rows, fields))
+
+
+class NDJSONRenderer(StreamingRenderer):
+    '''
+    Newline delimited JSON, one object per line.
+    '''
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    encoder_class = JSONEncoder
+
+    def encode_row(self, row, fields):
+        if orjson is not None:
+            return orjson_dumps(row).decode() + '\n'
+        return json.dumps(row, cls=self.encoder_class, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class CSVRenderer(StreamingRenderer):
+    '''
+    Comma separated values with header line of field names.
+    Dates and times are rendered the same way as in JSON responses.
+    '''
+    media_type = 'text/csv'
+    format = 'csv'
+
+    class LineBuffer:
+        def write(self, value):
+            return value
+
+    def __init__(self):
+        self.writer = csv.writer(self.LineBuffer())
+        self.encoder = JSONEncoder()
+
+    def encode_value(self, value):
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        return self.encoder.default(value)
+
+    def encode_header(self, fields):
+        return self.writer.writerow(fields)
+
+    def encode_row(self, row, fields):
+        return self.writer.writerow([self.encode_value(row[field]) for field in fields])
@@ -1,20 +1,225 @@
+from datetime import timedelta
+from typing import Union
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+
+from api import cache as patient_list_cache
+from api import uploads
+from api.models import Material, MaterialUpload, Patient, Profile, Tombstone
+
+
+class SparseFieldsetSerializerMixin:
+    '''
+    Renders only `fields` passed on init. Dotted names select fields of nested serializers,
+    e.g. `['id', 'doctor.full_name']`, a bare name of nested serializer keeps all its fields.
+    Model fields read by fields without a model field source are declared in `Meta.query_fields`.
+    '''
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            self.restrict_fields(fields)
 
-from api.models import Material, Patient, Profile
+    def restrict_fields(self, fields):
+        nested_fields = {}
+        for name in fields:
+            name, _, nested_name = name.partition('.')
+            nested_fields.setdefault(name, []).append(nested_name)
 
+        unknown = [name for name in nested_fields if name not in self.fields]
+        if unknown:
+            raise serializers.ValidationError({'fields': [f'Unknown field: {name}.' for name in unknown]})
 
-class ProfileSerializer(serializers.ModelSerializer):
+        for name in list(self.fields):
+            if name not in nested_fields:
+                self.fields.pop(name)
+        for name, names in nested_fields.items():
+            field = self.fields[name]
+            if all(names):
+                if not isinstance(field, SparseFieldsetSerializerMixin):
+                    raise serializers.ValidationError({'fields': [f'Field {name} has no nested fields.']})
+                field.restrict_fields(names)
+
+    def get_query_fields(self):
+        '''
+        Returns model field paths (for only()) read by rendered fields, None if some are unknown.
+        '''
+        query_fields = getattr(self.Meta, 'query_fields', {})
+        opts = self.Meta.model._meta
+        paths = []
+        for name, field in self.fields.items():
+            if name in query_fields:
+                paths.extend(query_fields[name])
+            elif field.source == '*':
+                return None
+            elif isinstance(field, SparseFieldsetSerializerMixin) and '.' not in field.source:
+                nested_paths = field.get_query_fields()
+                if nested_paths is None:
+                    return None
+                paths.extend(f'{field.source}__{path}' for path in nested_paths)
+            elif isinstance(field, serializers.BaseSerializer) or '.' in field.source:
+                return None
+            else:
+                try:
+                    # Accepts attnames like `user_id` too
+                    model_field = opts.get_field(field.source)
+                except FieldDoesNotExist:
+                    return None
+                paths.append(model_field.name)
+        return paths
+
+
+class ProfileSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
         fields = ['id', 'full_name', 'company_name', 'birth_date', 'user_id']
+        query_fields = {'full_name': ['user__first_name', 'user__last_name']}
+        # Same as user.get_full_name(), see api.compiled
+        compiled_fields = {
+            'full_name': (
+                lambda prefix: Concat(f'{prefix}user__first_name', Value(' '), f'{prefix}user__last_name'),
+                str.strip,
+            ),
+        }
 
     def get_full_name(self, profile: Profile) -> str:
         return profile.user.get_full_name()
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class BulkPatientListSerializer(serializers.ListSerializer):
+    '''
+    Validates list of patients and writes them with bulk queries in one transaction.
+    Rows with `id` replace patients from `queryset` context, other rows are created.
+    Errors are reported per row in the order of input.
+    '''
+    id_field = serializers.IntegerField()
+
+    def get_instances(self, data):
+        ids = set()
+        for item in data:
+            try:
+                ids.add(self.id_field.run_validation(item['id']))
+            except (TypeError, KeyError, serializers.ValidationError):
+                pass
+        return self.context['queryset'].in_bulk(ids) if ids else {}
+
+    def get_doctors(self, data):
+        '''
+        Fetches profiles of all `doctor` ids in one query. Returns None if rows have no doctor field.
+        Rows validate `doctor` as plain id, instead of one profile query per row.
+        '''
+        field = self.child.fields.get('doctor')
+        if not isinstance(field, serializers.PrimaryKeyRelatedField):
+            return None
+        self.doctor_field = field
+        self.child.fields['doctor'] = serializers.IntegerField(
+            source='doctor_id', required=field.required, allow_null=field.allow_null,
+        )
+        ids = set()
+        for item in data:
+            try:
+                ids.add(self.id_field.run_validation(item['doctor']))
+            except (TypeError, KeyError, serializers.ValidationError):
+                pass
+        return field.get_queryset().in_bulk(ids) if ids else {}
+
+    def resolve_doctor(self, validated, doctors):
+        doctor_id = validated.pop('doctor_id')
+        if doctor_id is None:
+            validated['doctor'] = None
+            return
+        if doctor_id not in doctors:
+            message = self.doctor_field.error_messages['does_not_exist'].format(pk_value=doctor_id)
+            raise serializers.ValidationError({'doctor': [message]}, code='does_not_exist')
+        validated['doctor'] = doctors[doctor_id]
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            message = self.error_messages['not_a_list'].format(input_type=type(data).__name__)
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='not_a_list')
+
+        instances = self.get_instances(data)
+        doctors = self.get_doctors(data)
+        ret = []
+        errors = []
+
+        for item in data:
+            try:
+                validated = self.child.run_validation(item)
+                if doctors is not None and 'doctor_id' in validated:
+                    self.resolve_doctor(validated, doctors)
+                if 'id' in item:
+                    instance = instances.get(self.id_field.run_validation(item['id']))
+                    if instance is None:
+                        raise serializers.ValidationError({'id': ['Patient not found.']})
+                    validated['instance'] = instance
+            except serializers.ValidationError as exc:
+                errors.append(exc.detail)
+            else:
+                ret.append(validated)
+                errors.append({})
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return ret
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        batch_size = settings.BULK_BATCH_SIZE
+        now = timezone.now()
+
+        instances = []
+        created = []
+        updated = []
+        update_fields = {'updated'}
+        # Bulk queries send no signals, cached lists of previous doctors are invalidated
+        # and tombstones of reassigned patients are created here
+        previous_doctor_ids = set()
+        tombstones = []
+        for attrs in validated_data:
+            instance = attrs.pop('instance', None)
+            if instance is None:
+                instance = model(**attrs)
+                created.append(instance)
+            else:
+                previous_doctor_id = instance.doctor_id
+                previous_doctor_ids.add(previous_doctor_id)
+                for attr, value in attrs.items():
+                    setattr(instance, attr, value)
+                if instance.doctor_id != previous_doctor_id:
+                    tombstones.append(Tombstone(
+                        model=Tombstone.ModelChoice.PATIENT,
+                        object_id=instance.id,
+                        patient_id=instance.id,
+                        doctor_id=previous_doctor_id,
+                    ))
+                # auto_now is not applied by bulk_update
+                instance.updated = now
+                update_fields.update(attrs)
+                updated.append(instance)
+            instances.append(instance)
+
+        with transaction.atomic():
+            model.objects.bulk_create(created, batch_size=batch_size)
+            if updated:
+                model.objects.bulk_update(updated, update_fields, batch_size=batch_size)
+            Tombstone.objects.bulk_create(tombstones, batch_size=batch_size)
+            patient_list_cache.invalidate(*previous_doctor_ids, *(instance.doctor_id for instance in instances))
+        return instances
+
+
+class PatientSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     '''
     Serializer for non admin users.
     Links user.profile to doctor field on creation.
@@ -22,7 +227,11 @@ class PatientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Patient
-        fields = ['id', 'first_name', 'last_name', 'birth_date', 'gender', 'med_condition', 'created', 'updated',]
+        fields = [
+            'id', 'first_name', 'last_name', 'birth_date', 'gender', 'med_condition',
+            'materials_count', 'last_material_at', 'created', 'updated',
+        ]
+        list_serializer_class = BulkPatientListSerializer
 
     def create(self, validated_data):
         user = self.context.get('request').user
@@ -32,10 +241,10 @@ class PatientSerializer(serializers.ModelSerializer):
             f"You can not use {self.__class__.__name__} serializer with admin users."
         )
 
-        return Patient.objects.create(doctor_id=user.profile.id, **validated_data)
+        return Patient.objects.create(doctor_id=user.profile_id, **validated_data)
     
 
-class FullPatientSerializer(serializers.ModelSerializer):
+class FullPatientSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     '''
     Serializer for admin get views.
     Renders profile object on doctor field
@@ -45,7 +254,10 @@ class FullPatientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Patient
-        fields = ['id', 'first_name', 'last_name', 'birth_date', 'gender', 'med_condition', 'doctor', 'created', 'updated',]
+        fields = [
+            'id', 'first_name', 'last_name', 'birth_date', 'gender', 'med_condition', 'doctor',
+            'materials_count', 'last_material_at', 'created', 'updated',
+        ]
 
 
 class CreatePatientSerializer(serializers.ModelSerializer):
@@ -56,15 +268,99 @@ class CreatePatientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Patient
-        fields = ['id', 'first_name', 'last_name', 'birth_date', 'gender', 'med_condition', 'doctor', 'created', 'updated',]
+        fields = [
+            'id', 'first_name', 'last_name', 'birth_date', 'gender', 'med_condition', 'doctor',
+            'materials_count', 'last_material_at', 'created', 'updated',
+        ]
+        list_serializer_class = BulkPatientListSerializer
+
+
+class SyncWatermarkSerializer(serializers.Serializer):
+    '''
+    Position of delta sync: last seen (updated, id) pair.
+    Empty `updated_since` starts from the beginning.
+    Watermarks older than kept tombstones are rejected, their deletions may be pruned.
+    '''
+    updated_since = serializers.DateTimeField(required=False)
+    after_id = serializers.IntegerField(min_value=0, default=0)
+
+    def validate_updated_since(self, value):
+        if value < timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS):
+            raise serializers.ValidationError('Watermark expired, sync from the beginning.')
+        return value
+
+
+class TombstoneSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Tombstone
+        fields = ['model', 'object_id', 'patient_id', 'deleted']
 
 
 class MaterialSerializer(serializers.ModelSerializer):
+    '''
+    Media files are not served publicly, clients fetch files from `download_url`.
+    `file` is upload only, its storage name is the content hash and would tell whether
+    a file with given content is stored.
+    '''
+    download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Material
-        fields = ['id', 'file', 'created', 'updated']
+        fields = ['id', 'file', 'name', 'download_url', 'thumbnail_url', 'preview_status', 'created', 'updated']
+        read_only_fields = ['name', 'preview_status']
+        extra_kwargs = {'file': {'write_only': True}}
+
+    def get_download_url(self, material: Material) -> str:
+        return self.get_material_url('material-download', material)
+
+    def get_thumbnail_url(self, material: Material) -> Union[str, None]:
+        if material.preview_status != Material.PreviewStatusChoice.READY:
+            return None
+        return self.get_material_url('material-thumbnail', material)
+
+    def get_material_url(self, view_name, material):
+        return reverse(
+            view_name,
+            kwargs={'patient_pk': material.patient_id, 'pk': material.id},
+            request=self.context.get('request'),
+        )
     
     def create(self, validated_data):
-        patient_id = self.context.get('patient_id')
-        return Material.objects.create(patient_id=patient_id, **validated_data)
\ No newline at end of file
+        if 'patient' not in validated_data:
+            validated_data['patient_id'] = self.context.get('patient_id')
+        return Material.objects.create(**validated_data)
+
+class MaterialUploadSerializer(serializers.ModelSerializer):
+    '''
+    Starts resumable upload of a material file.
+    `received_chunks` tells which chunks are still to be sent when resuming.
+    '''
+    size = serializers.IntegerField(min_value=1)
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+    chunks_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = MaterialUpload
+        fields = ['id', 'filename', 'size', 'sha256', 'chunk_size', 'chunks_count', 'received_chunks', 'created']
+        read_only_fields = ['chunk_size', 'received_chunks']
+
+    def validate_size(self, value):
+        if value > settings.MATERIAL_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Ensure this value is less than or equal to {settings.MATERIAL_UPLOAD_MAX_SIZE}.')
+        return value
+
+    def validate_sha256(self, value):
+        return value.lower()
+
+    def create(self, validated_data):
+        upload = MaterialUpload.objects.create(chunk_size=settings.MATERIAL_UPLOAD_CHUNK_SIZE, **validated_data)
+        uploads.create_part_file(upload)
+        return upload
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Retried chunks are recorded more than once
+        data['received_chunks'] = sorted(set(data['received_chunks']))
+        return data
@@ -1,9 +1,173 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F, OuterRef, QuerySet, Subquery, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
 from django.dispatch import receiver
-from api.models import Profile
+from api import cache as patient_list_cache
+from api import jobs, uploads
+from core.authentication import token_versions, user_cache
+from api.models import Material, MaterialUpload, Patient, Profile, Tombstone
+from api.storage import get_material_storage
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_profile_for_new_user(sender, **kwargs):
   if kwargs['created']:
-    Profile.objects.create(user=kwargs['instance'])
\ No newline at end of file
+    Profile.objects.create(user=kwargs['instance'])
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user_on_user_change(sender, instance, **kwargs):
+  user_cache.invalidate(instance.pk)
+  token_versions.forget(instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_user_on_profile_change(sender, instance, **kwargs):
+  user_cache.invalidate(instance.user_id)
+
+@receiver(post_delete, sender=Patient)
+def create_patient_tombstone(sender, instance, **kwargs):
+  Tombstone.objects.create(
+    model=Tombstone.ModelChoice.PATIENT,
+    object_id=instance.id,
+    patient_id=instance.id,
+    doctor_id=instance.doctor_id,
+  )
+
+@receiver(post_save, sender=Patient)
+def create_patient_tombstone_on_reassign(sender, instance, created, **kwargs):
+  previous_doctor_id = getattr(instance, '_loaded_doctor_id', None)
+  if created or previous_doctor_id is None or previous_doctor_id == instance.doctor_id:
+    return
+  # Patient leaves previous doctor's sync scope
+  Tombstone.objects.create(
+    model=Tombstone.ModelChoice.PATIENT,
+    object_id=instance.id,
+    patient_id=instance.id,
+    doctor_id=previous_doctor_id,
+  )
+
+def get_material_doctor_id(material):
+  # Views pass the already fetched parent patient, avoid querying it again
+  if Material.patient.is_cached(material):
+    return material.patient.doctor_id
+  return Patient.objects.filter(id=material.patient_id).values_list('doctor_id', flat=True).first()
+
+@receiver(post_delete, sender=Material)
+def create_material_tombstone(sender, instance, **kwargs):
+  doctor_id = get_material_doctor_id(instance)
+  if doctor_id is None:
+    # Only when the patient row was deleted before its materials (e.g. raw SQL), its tombstone covers them.
+    # Cascades delete materials first, they get tombstones of their own.
+    return
+  Tombstone.objects.create(
+    model=Tombstone.ModelChoice.MATERIAL,
+    object_id=instance.id,
+    patient_id=instance.patient_id,
+    doctor_id=doctor_id,
+  )
+
+@receiver(post_delete, sender=Profile)
+def delete_doctor_tombstones(sender, instance, **kwargs):
+  Tombstone.objects.filter(doctor_id=instance.id).delete()
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_patient_lists_on_patient_change(sender, instance, **kwargs):
+  doctor_ids = {instance.doctor_id, getattr(instance, '_loaded_doctor_id', None)} - {None}
+  patient_list_cache.invalidate(*doctor_ids)
+
+@receiver(post_save, sender=Material)
+@receiver(post_delete, sender=Material)
+def invalidate_patient_lists_on_material_change(sender, instance, **kwargs):
+  doctor_id = get_material_doctor_id(instance)
+  if doctor_id is not None:
+    patient_list_cache.invalidate(doctor_id)
+
+def add_material_to_patient_stats(patient_id, created):
+  # Counted in the database, concurrent changes of the same patient do not overwrite each other.
+  # `updated` is bumped as representation of the patient changes.
+  Patient.objects.filter(id=patient_id).update(
+    materials_count=F('materials_count') + 1,
+    # GREATEST skips NULL of the first material
+    last_material_at=Greatest('last_material_at', Value(created)),
+    updated=timezone.now(),
+  )
+
+def remove_material_from_patient_stats(patient_id):
+  Patient.objects.filter(id=patient_id).update(
+    materials_count=Greatest(F('materials_count') - 1, Value(0)),
+    last_material_at=Subquery(
+      Material.objects.filter(patient_id=OuterRef('id')).order_by('-created').values('created')[:1]
+    ),
+    updated=timezone.now(),
+  )
+
+@receiver(post_save, sender=Material)
+def update_patient_stats_on_material_save(sender, instance, created, **kwargs):
+  loaded_patient_id = getattr(instance, '_loaded_patient_id', None)
+  if created:
+    add_material_to_patient_stats(instance.patient_id, instance.created)
+  elif loaded_patient_id is not None and loaded_patient_id != instance.patient_id:
+    remove_material_from_patient_stats(loaded_patient_id)
+    add_material_to_patient_stats(instance.patient_id, instance.created)
+  instance._loaded_patient_id = instance.patient_id
+
+def is_deleted_with_patient(origin):
+  # Materials are deleted by anything else than a material delete only in cascade of their patient's delete
+  model = origin.model if isinstance(origin, QuerySet) else type(origin)
+  return not issubclass(model, Material)
+
+@receiver(post_delete, sender=Material)
+def update_patient_stats_on_material_delete(sender, instance, origin=None, **kwargs):
+  if origin is not None and is_deleted_with_patient(origin):
+    # Stats go with the patient, no update per material
+    return
+  remove_material_from_patient_stats(instance.patient_id)
+
+@receiver(post_delete, sender=MaterialUpload)
+def delete_material_upload_part_file(sender, instance, **kwargs):
+  # Rolled back deletes, e.g. failed finalize, keep their part files.
+  # Name is taken now, deleted instance has no id.
+  part_name = instance.part_name
+  transaction.on_commit(lambda: uploads.delete_part_file(part_name))
+
+def release_material_blob(name):
+  storage = get_material_storage()
+  def delete_if_unreferenced():
+    if not storage.is_blob(name):
+      return
+    with transaction.atomic():
+      # Waits for materials adopting the blob to commit (see ContentAddressedStorage.adopt)
+      storage.lock_blob(name)
+      if not Material.objects.filter(file=name).exists():
+        storage.delete(name)
+  # Checked after commit, rolled back deletes keep their blobs
+  transaction.on_commit(delete_if_unreferenced)
+
+@receiver(post_delete, sender=Material)
+def release_blob_on_material_delete(sender, instance, **kwargs):
+  if instance.file:
+    release_material_blob(instance.file.name)
+
+@receiver(post_save, sender=Material)
+def release_blob_on_material_file_change(sender, instance, **kwargs):
+  loaded_file_name = getattr(instance, '_loaded_file_name', None)
+  if loaded_file_name and loaded_file_name != instance.file.name:
+    release_material_blob(loaded_file_name)
+  instance._loaded_file_name = instance.file.name
+
+@receiver(post_save, sender=Material)
+def enqueue_material_preview(sender, instance, **kwargs):
+  if getattr(instance, '_preview_requested', False):
+    instance._preview_requested = False
+    jobs.enqueue('material_preview', material_id=instance.id)
+
+@receiver(post_delete, sender=Material)
+def delete_material_thumbnail(sender, instance, **kwargs):
+  if instance.thumbnail:
+    thumbnail = instance.thumbnail
+    # Deleted after commit, rolled back deletes keep their thumbnails
+    transaction.on_commit(lambda: thumbnail.delete(save=False))
@@ -0,0 +1,78 @@
+'''
+Content addressed storage of material files.
+Every unique content is stored once under its SHA-256, sharded as `blobs/ab/cd/abcd...`,
+materials with equal files share the blob. Blobs are deleted when no material references them
+(see api.signals.handlers). Adopting a file and deleting an unreferenced blob lock the blob
+until the end of their transactions, so a blob is never deleted while a material adopting it commits.
+'''
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.move import file_move_safe
+from django.db import connection
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    blobs_dir = 'blobs'
+
+    def get_blob_name(self, sha256):
+        return f'{self.blobs_dir}/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+    def is_blob(self, name):
+        return name.startswith(f'{self.blobs_dir}/')
+
+    def lock_blob(self, name):
+        '''
+        Locks blob by its name or SHA-256 until the end of the current transaction.
+        '''
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [name.rsplit('/', 1)[-1]])
+
+    def get_available_name(self, name, max_length=None):
+        # Blob names are derived from content, an existing name already holds the same content
+        return name
+
+    def _save(self, name, content):
+        '''
+        Hashes content while writing it to a temporary file, keeps it only if the blob is new.
+        '''
+        directory = self.path(self.blobs_dir)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            except BaseException:
+                os.unlink(file.name)
+                raise
+        return self.adopt(file.name, digest.hexdigest())
+
+    def adopt(self, path, sha256):
+        '''
+        Moves file at local path into the blob of its content, drops it if the blob exists.
+        Returns blob name. Must run in the transaction saving the material which references the blob.
+        '''
+        name = self.get_blob_name(sha256)
+        # Held until the material is committed, concurrent release of the blob sees it referenced
+        self.lock_blob(sha256)
+        blob_path = self.path(name)
+        if os.path.exists(blob_path):
+            os.unlink(path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.chmod(path, self.file_permissions_mode or 0o644)
+            file_move_safe(path, blob_path, allow_overwrite=True)
+        return name
+
+
+material_storage = ContentAddressedStorage()
+
+
+def get_material_storage():
+    return material_storage
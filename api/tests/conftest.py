@@ -1,9 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 import pytest
 from model_bakery import baker
 
-from api.models import Patient
+from api.models import Material, Patient
 
 
 @pytest.fixture
@@ -69,4 +71,19 @@ def user_patient(user):
 
 @pytest.fixture
 def admin_patient(admin_user):
-    return baker.make(Patient, doctor=admin_user.profile)
\ No newline at end of file
+    return baker.make(Patient, doctor=admin_user.profile)
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+@pytest.fixture
+def make_material():
+    def make(patient, content=b'%PDF-1.4 lab results', name='labs.pdf'):
+        return baker.make(Material, patient=patient, file=SimpleUploadedFile(name, content))
+    return make
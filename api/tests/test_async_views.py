@@ -0,0 +1,103 @@
+from django.urls import reverse
+from rest_framework import status
+import pytest
+from model_bakery import baker
+
+from api.models import Material, Patient
+from core.serializers import TokenObtainPairSerializer
+
+
+def get_auth_header(user):
+    return {'HTTP_AUTHORIZATION': f'JWT {TokenObtainPairSerializer.get_token(user).access_token}'}
+
+
+@pytest.mark.django_db
+class TestAsyncPatientList:
+    url = reverse('async-patient-list')
+
+    def test_if_user_anonymous_returns_401(self, client):
+        response = client.get(self.url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert 'WWW-Authenticate' in response
+
+    def test_invalid_token_returns_401(self, client):
+        response = client.get(self.url, HTTP_AUTHORIZATION='JWT invalid')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_post_returns_405(self, client, user):
+        response = client.post(self.url, **get_auth_header(user))
+
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+    def test_only_relative_patients(self, client, user, user_patient, admin_patient):
+        response = client.get(self.url, **get_auth_header(user))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [patient['id'] for patient in response.json()['results']] == [user_patient.id]
+
+    def test_same_as_sync_endpoint(self, client, admin_user, user_patient, admin_patient):
+        client.force_authenticate(admin_user)
+        sync_data = client.get(reverse('patient-list')).json()
+
+        response = client.get(self.url, **get_auth_header(admin_user))
+
+        assert response.json() == sync_data
+
+    def test_pages(self, settings, client, user):
+        settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, 'PAGE_SIZE': 2}
+        baker.make(Patient, doctor=user.profile, _quantity=5)
+
+        first = client.get(self.url, **get_auth_header(user)).json()
+        second = client.get(first['next'], **get_auth_header(user)).json()
+
+        assert first['count'] == 5
+        assert first['previous'] is None
+        assert second['previous'].endswith(self.url)
+        assert len(second['results']) == 2
+
+    def test_invalid_page_returns_404(self, client, user, user_patient):
+        response = client.get(self.url, {'page': 2}, **get_auth_header(user))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestAsyncPatientDetail:
+
+    def test_non_relative_returns_404(self, client, user, admin_patient):
+        url = reverse('async-patient-detail', kwargs={'pk': admin_patient.id})
+
+        response = client.get(url, **get_auth_header(user))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_same_as_sync_endpoint(self, client, user, user_patient):
+        client.force_authenticate(user)
+        sync_data = client.get(reverse('patient-detail', kwargs={'pk': user_patient.id})).json()
+        url = reverse('async-patient-detail', kwargs={'pk': user_patient.id})
+
+        response = client.get(url, **get_auth_header(user))
+
+        assert response.json() == sync_data
+
+
+@pytest.mark.django_db
+class TestAsyncMaterialList:
+
+    def test_non_relative_parent_patient_404(self, client, user, admin_patient):
+        url = reverse('async-material-list', kwargs={'patient_pk': admin_patient.id})
+
+        response = client.get(url, **get_auth_header(user))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_success_get_relative(self, client, user, user_patient):
+        material = baker.make(Material, patient=user_patient)
+        url = reverse('async-material-list', kwargs={'patient_pk': user_patient.id})
+
+        response = client.get(url, **get_auth_header(user))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [row['id'] for row in response.json()['results']] == [material.id]
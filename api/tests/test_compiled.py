@@ -0,0 +1,96 @@
+import json
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
+import pytest
+from model_bakery import baker
+
+from api.compiled import compile_serializer
+from api.models import Patient, Profile
+from api.serializers import FullPatientSerializer, PatientSerializer, ProfileSerializer
+
+
+def as_json(data):
+    return json.dumps(data, cls=JSONEncoder)
+
+
+@pytest.fixture
+def patients(user, admin_user):
+    user.first_name, user.last_name = 'Gregory', ''
+    user.save()
+    return [
+        baker.make(Patient, doctor=user.profile, birth_date=None, gender=None, first_name='Ann'),
+        baker.make(Patient, doctor=admin_user.profile, gender=Patient.GenderChoice.FEMALE, birth_date='1990-05-17'),
+    ]
+
+
+@pytest.mark.django_db
+class TestCompiledSerializer:
+
+    @pytest.mark.parametrize('serializer_class,fields', [
+        (PatientSerializer, None),
+        (FullPatientSerializer, None),
+        (FullPatientSerializer, ('id', 'doctor.full_name', 'doctor.user_id')),
+        (PatientSerializer, ('birth_date', 'gender', 'updated')),
+    ])
+    def test_equals_serializer_data(self, patients, serializer_class, fields):
+        queryset = Patient.objects.order_by('id')
+        compiled = compile_serializer(serializer_class, fields)
+        serializer = serializer_class(queryset, many=True, fields=list(fields) if fields else None)
+
+        assert as_json(compiled.render(compiled.values(queryset))) == as_json(serializer.data)
+
+    def test_equals_serializer_data_in_other_timezone(self, patients):
+        queryset = Patient.objects.order_by('id')
+        compiled = compile_serializer(PatientSerializer)
+
+        with timezone.override('Asia/Tashkent'):
+            assert as_json(compiled.render(compiled.values(queryset))) == as_json(
+                PatientSerializer(queryset, many=True).data
+            )
+
+    def test_profile_full_name_in_sql(self, patients):
+        compiled = compile_serializer(ProfileSerializer)
+        queryset = Profile.objects.order_by('id')
+
+        assert as_json(compiled.render(compiled.values(queryset))) == as_json(ProfileSerializer(queryset, many=True).data)
+        assert 'CONCAT' in str(compiled.values(queryset).query).upper()
+
+    def test_method_field_without_compiled_source_not_compilable(self):
+        class NoteSerializer(serializers.ModelSerializer):
+            note = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Patient
+                fields = ['id', 'note']
+
+            def get_note(self, patient):
+                return str(patient)
+
+        assert compile_serializer(NoteSerializer) is None
+
+
+@pytest.mark.django_db
+class TestCompiledEndpoints:
+
+    def test_admin_list_matches_serializer(self, admin_client, patients, django_assert_num_queries):
+        # count, page
+        with django_assert_num_queries(2):
+            response = admin_client.get(reverse('patient-list'), {'ordering': 'birth_date'})
+
+        queryset = Patient.objects.select_related('doctor__user').order_by('birth_date')
+        assert as_json(response.data['results']) == as_json(FullPatientSerializer(queryset, many=True).data)
+
+    def test_retrieve_matches_serializer(self, user_client, patients):
+        patient = patients[0]
+
+        response = user_client.get(reverse('patient-detail', args=[patient.id]))
+
+        assert as_json(response.data) == as_json(PatientSerializer(patient).data)
+
+    def test_retrieve_invalid_pk_returns_404(self, user_client):
+        response = user_client.get(reverse('patient-detail', args=['x']))
+
+        assert response.status_code == 404
@@ -0,0 +1,87 @@
+import csv
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+import pytest
+
+from api.models import Patient
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    def write(rows, fieldnames=('first_name', 'last_name', 'birth_date', 'gender', 'med_condition')):
+        path = tmp_path / 'patients.csv'
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        return str(path)
+    return write
+
+
+@pytest.mark.django_db
+class TestImportPatients:
+
+    def test_import_for_doctor(self, write_csv, user, patient_data):
+        path = write_csv([patient_data] * 3)
+
+        call_command('import_patients', path, doctor=user.profile.id, stdout=None)
+
+        patients = Patient.objects.filter(doctor=user.profile)
+        assert patients.count() == 3
+        patient = patients.first()
+        assert patient.first_name == patient_data['first_name']
+        assert str(patient.birth_date) == patient_data['birth_date']
+        assert patient.created is not None
+
+    def test_empty_nullable_fields_are_null(self, write_csv, user, patient_data):
+        path = write_csv([{**patient_data, 'birth_date': '', 'gender': ''}])
+
+        call_command('import_patients', path, doctor=user.profile.id)
+
+        patient = Patient.objects.get(doctor=user.profile)
+        assert patient.birth_date is None
+        assert patient.gender is None
+
+    def test_import_with_doctor_column(self, write_csv, user, admin_user, patient_data):
+        fieldnames = list(patient_data) + ['doctor']
+        path = write_csv([
+            {**patient_data, 'doctor': user.profile.id},
+            {**patient_data, 'doctor': admin_user.profile.id},
+        ], fieldnames)
+
+        call_command('import_patients', path)
+
+        assert Patient.objects.filter(doctor=user.profile).count() == 1
+        assert Patient.objects.filter(doctor=admin_user.profile).count() == 1
+
+    def test_unknown_doctor_stops_import(self, write_csv, patient_data):
+        path = write_csv([{**patient_data, 'doctor': 99999}], list(patient_data) + ['doctor'])
+
+        with pytest.raises(CommandError):
+            call_command('import_patients', path)
+
+        assert not Patient.objects.exists()
+
+    def test_invalid_row_stops_and_resumes(self, write_csv, user, patient_data, capsys):
+        path = write_csv([patient_data, patient_data, {**patient_data, 'gender': 'X'}, patient_data])
+
+        with pytest.raises(CommandError, match='--skip 2'):
+            call_command('import_patients', path, doctor=user.profile.id, chunk_size=2)
+
+        assert Patient.objects.count() == 2
+        assert 'Row 3' in capsys.readouterr().err
+
+        path = write_csv([patient_data, patient_data, patient_data, patient_data])
+        call_command('import_patients', path, doctor=user.profile.id, chunk_size=2, skip=2)
+
+        assert Patient.objects.count() == 4
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_with_workers(write_csv, user, patient_data):
+    path = write_csv([patient_data] * 25)
+
+    call_command('import_patients', path, doctor=user.profile.id, chunk_size=4, workers=2)
+
+    assert Patient.objects.filter(doctor=user.profile).count() == 25
@@ -0,0 +1,270 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, connections
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+import pytest
+from model_bakery import baker
+
+from api import uploads
+from api.models import Material, MaterialUpload
+
+
+CONTENT = b'0123456789abcdefghij-dicom-study'
+
+
+@pytest.fixture(autouse=True)
+def upload_settings(settings):
+    settings.MATERIAL_UPLOAD_CHUNK_SIZE = 8
+
+@pytest.fixture
+def upload_data():
+    return {
+        'filename': 'study.dcm',
+        'size': len(CONTENT),
+        'sha256': hashlib.sha256(CONTENT).hexdigest(),
+    }
+
+@pytest.fixture
+def user_upload(user_client, user_patient, upload_data):
+    response = user_client.post(get_list_url(user_patient.id), data=upload_data)
+    return MaterialUpload.objects.get(id=response.data['id'])
+
+
+def get_list_url(patient_pk):
+    return reverse('material-upload-list', kwargs={'patient_pk': patient_pk})
+
+def get_detail_url(upload):
+    return reverse('material-upload-detail', kwargs={'patient_pk': upload.patient_id, 'pk': upload.id})
+
+def get_finalize_url(upload):
+    return reverse('material-upload-finalize', kwargs={'patient_pk': upload.patient_id, 'pk': upload.id})
+
+def put_chunk(client, upload, offset, content=CONTENT):
+    return client.put(
+        f'{get_detail_url(upload)}?offset={offset}',
+        data=content[offset:offset + upload.chunk_size],
+        content_type='application/octet-stream',
+    )
+
+
+@pytest.mark.django_db
+class TestStartMaterialUpload:
+
+    def test_if_user_anonymous_returns_401(self, client, user_patient, upload_data):
+        response = client.post(get_list_url(user_patient.id), data=upload_data)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_non_relative_parent_patient_404(self, user_client, admin_patient, upload_data):
+        response = user_client.post(get_list_url(admin_patient.id), data=upload_data)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_invalid_checksum_returns_400(self, user_client, user_patient, upload_data):
+        response = user_client.post(get_list_url(user_patient.id), data={**upload_data, 'sha256': 'abc'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_success_preallocates_part_file(self, user_client, user_patient, upload_data):
+        response = user_client.post(get_list_url(user_patient.id), data=upload_data)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['chunk_size'] == 8
+        assert response.data['chunks_count'] == 4
+        upload = MaterialUpload.objects.get(id=response.data['id'])
+        assert os.path.getsize(default_storage.path(upload.part_name)) == len(CONTENT)
+
+
+@pytest.mark.django_db
+class TestMaterialUploadChunk:
+
+    def test_non_relative_returns_404(self, user_client, admin_patient):
+        upload = baker.make(MaterialUpload, patient=admin_patient, size=len(CONTENT), chunk_size=8)
+
+        response = put_chunk(user_client, upload, 0)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @pytest.mark.parametrize('offset', ['', '-8', '3', '32', 'x'])
+    def test_invalid_offset_returns_400(self, user_client, user_upload, offset):
+        response = user_client.put(
+            f'{get_detail_url(user_upload)}?offset={offset}',
+            data=b'01234567',
+            content_type='application/octet-stream',
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_wrong_chunk_length_returns_400(self, user_client, user_upload):
+        response = put_chunk(user_client, user_upload, 0, b'0123')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['detail'] == 'Chunk at offset 0 must have 8 bytes.'
+
+    def test_received_chunks_for_resume(self, user_client, user_upload):
+        put_chunk(user_client, user_upload, 16)
+        put_chunk(user_client, user_upload, 0)
+        put_chunk(user_client, user_upload, 16)
+
+        response = user_client.get(get_detail_url(user_upload))
+
+        assert response.data['received_chunks'] == [0, 2]
+
+
+@pytest.mark.django_db
+class TestFinalizeMaterialUpload:
+
+    def test_success_out_of_order_chunks(
+        self, user_client, user_patient, user_upload, django_capture_on_commit_callbacks
+    ):
+        for offset in [24, 8, 0, 16]:
+            assert put_chunk(user_client, user_upload, offset).status_code == status.HTTP_204_NO_CONTENT
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = user_client.post(get_finalize_url(user_upload))
+
+        assert response.status_code == status.HTTP_201_CREATED
+        material = Material.objects.get(id=response.data['id'])
+        assert material.patient_id == user_patient.id
+        assert material.file.read() == CONTENT
+        assert not MaterialUpload.objects.exists()
+        assert not default_storage.exists(user_upload.part_name)
+
+    def test_failed_commit_keeps_part_file(self, user_client, user_upload, monkeypatch):
+        for offset in range(0, len(CONTENT), 8):
+            put_chunk(user_client, user_upload, offset)
+
+        def fail(self):
+            raise DatabaseError('could not serialize access')
+
+        monkeypatch.setattr(MaterialUpload, 'delete', fail)
+        with pytest.raises(DatabaseError):
+            user_client.post(get_finalize_url(user_upload))
+        monkeypatch.undo()
+
+        assert not Material.objects.exists()
+        assert uploads.get_sha256(user_upload) == user_upload.sha256
+        assert user_client.post(get_finalize_url(user_upload)).status_code == status.HTTP_201_CREATED
+
+    def test_missing_chunks_returns_400(self, user_client, user_upload):
+        put_chunk(user_client, user_upload, 0)
+
+        response = user_client.post(get_finalize_url(user_upload))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not Material.objects.exists()
+
+    def test_checksum_mismatch_resets_chunks(self, user_client, user_upload):
+        corrupted = CONTENT.replace(b'dicom', b'DICOM')
+        for offset in range(0, len(CONTENT), 8):
+            put_chunk(user_client, user_upload, offset, corrupted)
+
+        response = user_client.post(get_finalize_url(user_upload))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        user_upload.refresh_from_db()
+        assert user_upload.received_chunks == []
+
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentFinalize:
+
+    @pytest.fixture
+    def slow_checksum(self, monkeypatch):
+        get_sha256 = uploads.get_sha256
+        hashing = threading.Event()
+
+        def slow_get_sha256(upload):
+            hashing.set()
+            time.sleep(0.3)
+            return get_sha256(upload)
+
+        monkeypatch.setattr(uploads, 'get_sha256', slow_get_sha256)
+        return hashing
+
+    def run_in_thread(self, user, method, *args, **kwargs):
+        results = []
+
+        def run():
+            client = APIClient()
+            client.force_authenticate(user=user)
+            try:
+                results.append(getattr(client, method)(*args, **kwargs).status_code)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, results
+
+    def test_second_finalize_returns_404(self, user_client, user, user_upload, slow_checksum):
+        for offset in range(0, len(CONTENT), 8):
+            put_chunk(user_client, user_upload, offset)
+
+        first, first_results = self.run_in_thread(user, 'post', get_finalize_url(user_upload))
+        slow_checksum.wait(5)
+        second, second_results = self.run_in_thread(user, 'post', get_finalize_url(user_upload))
+        first.join()
+        second.join()
+
+        assert first_results + second_results == [status.HTTP_201_CREATED, status.HTTP_404_NOT_FOUND]
+        assert Material.objects.get().file.read() == CONTENT
+
+    def test_chunk_during_finalize_returns_404(self, user_client, user, user_upload, slow_checksum):
+        for offset in range(0, len(CONTENT), 8):
+            put_chunk(user_client, user_upload, offset)
+
+        finalize, finalize_results = self.run_in_thread(user, 'post', get_finalize_url(user_upload))
+        slow_checksum.wait(5)
+        chunk, chunk_results = self.run_in_thread(
+            user, 'put', f'{get_detail_url(user_upload)}?offset=0',
+            data=b'X' * 8, content_type='application/octet-stream',
+        )
+        finalize.join()
+        chunk.join()
+
+        assert finalize_results + chunk_results == [status.HTTP_201_CREATED, status.HTTP_404_NOT_FOUND]
+        assert Material.objects.get().file.read() == CONTENT
+
+@pytest.mark.django_db
+class TestAbortMaterialUpload:
+
+    def test_success_deletes_part_file(self, user_client, user_upload, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            response = user_client.delete(get_detail_url(user_upload))
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert not default_storage.exists(user_upload.part_name)
+
+
+@pytest.mark.django_db
+class TestPruneMaterialUploads:
+
+    def test_deletes_expired_uploads_and_part_files(
+        self, user_client, user_patient, upload_data, django_capture_on_commit_callbacks
+    ):
+        expired, kept = [
+            MaterialUpload.objects.get(id=user_client.post(get_list_url(user_patient.id), data=upload_data).data['id'])
+            for _ in range(2)
+        ]
+        MaterialUpload.objects.filter(id=expired.id).update(created=timezone.now() - timedelta(hours=73))
+        out = io.StringIO()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            call_command('prune_material_uploads', hours=72, batch_size=1, stdout=out)
+
+        assert list(MaterialUpload.objects.all()) == [kept]
+        assert not default_storage.exists(expired.part_name)
+        assert default_storage.exists(kept.part_name)
+        assert '1 uploads deleted' in out.getvalue()
@@ -1,3 +1,7 @@
+import io
+import zipfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from rest_framework import status
 import pytest
@@ -51,6 +55,8 @@ class TestMaterialCreate:
             response = user_client.post(url, data={"file": file}, format='multipart')
 
         assert response.status_code == status.HTTP_201_CREATED
+        assert 'file' not in response.data
+        assert response.data['download_url'].endswith(f'/materials/{response.data["id"]}/download/')
    
 
 @pytest.mark.django_db
@@ -133,6 +139,42 @@ class TestRetrieveMaterial:
         assert response.status_code == status.HTTP_200_OK
 
 
+@pytest.mark.django_db
+class TestConditionalGetMaterial:
+
+    def test_list_not_modified_with_etag(self, user_client, user_patient, user_material):
+        url = reverse('material-list', kwargs={'patient_pk': user_patient.id})
+        etag = user_client.get(url)['ETag']
+
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_list_modified_after_create(self, user_client, user_patient, user_material):
+        url = reverse('material-list', kwargs={'patient_pk': user_patient.id})
+        etag = user_client.get(url)['ETag']
+
+        baker.make(Material, patient_id=user_patient.id)
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_retrieve_not_modified_with_etag(self, user_client, user_patient, user_material):
+        url = reverse('material-detail', kwargs={'patient_pk': user_patient.id, 'pk': user_material.id})
+        etag = user_client.get(url)['ETag']
+
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_non_relative_still_404(self, user_client, admin_patient, admin_material):
+        url = reverse('material-detail', kwargs={'patient_pk': admin_patient.id, 'pk': admin_material.id})
+
+        response = user_client.get(url, HTTP_IF_NONE_MATCH='"anything"')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
 @pytest.mark.django_db
 class TestMaterialUpdate:
 
@@ -217,4 +259,128 @@ class TestDeleteMaterial:
         response = user_client.delete(url)
 
         assert response.status_code == status.HTTP_204_NO_CONTENT
-        assert not Material.objects.filter(id=user_material.id).exists()
\ No newline at end of file
+        assert not Material.objects.filter(id=user_material.id).exists()
+
+@pytest.mark.django_db
+class TestMaterialQueryCount:
+
+    def test_list(self, user_client, user_patient, user_material, django_assert_num_queries):
+        url = reverse('material-list', kwargs={'patient_pk': user_patient.id})
+        # parent patient, count, page
+        with django_assert_num_queries(3):
+            response = user_client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_create(self, user_client, user_patient, django_assert_num_queries):
+        url = reverse('material-list', kwargs={'patient_pk': user_patient.id})
+        with open('api/tests/X-ray.jpg', 'rb') as file:
+            # parent patient, blob lock, insert, preview job, patient stats
+            with django_assert_num_queries(5):
+                response = user_client.post(url, data={"file": file}, format='multipart')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Material.objects.get().patient_id == user_patient.id
+
+    def test_retrieve(self, user_client, user_patient, user_material, django_assert_num_queries):
+        url = reverse('material-detail', kwargs={'patient_pk': user_patient.id, 'pk': user_material.id})
+        # validators, object
+        with django_assert_num_queries(2):
+            response = user_client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+class TestDownloadMaterial:
+    content = b'%PDF-1.4 scan'
+
+    @pytest.fixture
+    def uploaded_material(self, user_patient):
+        return baker.make(Material, patient=user_patient, file=SimpleUploadedFile('scan.pdf', self.content))
+
+    @classmethod
+    def get_url(cls, patient_pk, material_pk):
+        return reverse('material-download', kwargs={'patient_pk': patient_pk, 'pk': material_pk})
+
+    def test_if_user_anonymous_returns_401(self, client, user_patient, uploaded_material):
+        response = client.get(self.get_url(user_patient.id, uploaded_material.id))
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_non_relative_returns_404(self, user_client, admin_patient, admin_material):
+        response = user_client.get(self.get_url(admin_patient.id, admin_material.id))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_success_file_response(self, user_client, user_patient, uploaded_material):
+        response = user_client.get(self.get_url(user_patient.id, uploaded_material.id))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert b''.join(response.streaming_content) == self.content
+        assert response['Content-Disposition'].startswith('attachment')
+        assert 'X-Accel-Redirect' not in response
+
+    def test_success_accel_redirect(self, settings, user_client, user_patient, uploaded_material):
+        settings.MATERIAL_ACCEL_REDIRECT = True
+
+        response = user_client.get(self.get_url(user_patient.id, uploaded_material.id))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Accel-Redirect'] == f'/media/{uploaded_material.file.name}'
+        assert response['Content-Type'] == 'application/pdf'
+        assert response.content == b''
+
+    def test_download_url_in_list(self, user_client, user_patient, uploaded_material):
+        response = user_client.get(reverse('material-list', kwargs={'patient_pk': user_patient.id}))
+
+        assert response.data['results'][0]['download_url'].endswith(
+            self.get_url(user_patient.id, uploaded_material.id)
+        )
+
+
+@pytest.mark.django_db
+class TestMaterialArchive:
+
+    @classmethod
+    def get_url(cls, patient_pk):
+        return reverse('material-archive', kwargs={'patient_pk': patient_pk})
+
+    @classmethod
+    def read_archive(cls, response):
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_if_user_anonymous_returns_401(self, client, user_patient):
+        response = client.get(self.get_url(user_patient.id))
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_non_relative_returns_404(self, user_client, admin_patient):
+        response = user_client.get(self.get_url(admin_patient.id))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_success(self, user_client, user_patient, admin_patient):
+        baker.make(Material, patient=user_patient, file=SimpleUploadedFile('scan.jpg', b'\xff\xd8 jpeg'))
+        baker.make(Material, patient=user_patient, file=SimpleUploadedFile('notes.txt', b'notes ' * 100))
+        baker.make(Material, patient=user_patient, file=SimpleUploadedFile('notes.txt', b'other notes'))
+        baker.make(Material, patient=admin_patient, file=SimpleUploadedFile('other.txt', b'other patient'))
+
+        response = user_client.get(self.get_url(user_patient.id))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/zip'
+        assert response['Content-Disposition'] == f'attachment; filename="patient-{user_patient.id}-materials.zip"'
+        archive = self.read_archive(response)
+        assert archive.testzip() is None
+        assert archive.namelist() == ['scan.jpg', 'notes.txt', 'notes (2).txt']
+        assert archive.read('notes.txt') == b'notes ' * 100
+        assert archive.read('notes (2).txt') == b'other notes'
+        assert archive.getinfo('scan.jpg').compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo('notes.txt').compress_type == zipfile.ZIP_DEFLATED
+
+    def test_empty(self, user_client, user_patient):
+        response = user_client.get(self.get_url(user_patient.id))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert self.read_archive(response).namelist() == []
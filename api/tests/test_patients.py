@@ -1,9 +1,23 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.test import APIClient
 from model_bakery import baker
 import pytest
 
-from api.models import Patient
+from api import mixins
+from api.models import Material, Patient, Tombstone
+from api.pagination import KeysetPagination
+from api.serializers import PatientSerializer
+from api.views import PatientViewSet
 
 
 @pytest.mark.django_db
@@ -64,6 +78,535 @@ class TestListPatient:
         assert len(response.data["results"]) == related_patients_num
         assert len(list(map(lambda x: x['id'] in related_idxs, response.data["results"]))) == related_patients_num
 
+    def test_cursor_mode_has_no_count(self, user_client, user):
+        baker.make(Patient, 3, doctor=user.profile)
+
+        response = user_client.get(self.url, {'cursor': ''})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'count' not in response.data
+        assert len(response.data['results']) == 3
+
+    def test_cursor_mode_walks_all_pages(self, user_client, user, monkeypatch):
+        monkeypatch.setattr(KeysetPagination, 'page_size', 2)
+        patients = baker.make(Patient, 5, doctor=user.profile)
+
+        seen_ids = []
+        response = user_client.get(self.url, {'cursor': ''})
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            seen_ids += [patient['id'] for patient in response.data['results']]
+            if not response.data['next']:
+                break
+            response = user_client.get(response.data['next'])
+
+        assert seen_ids == [patient.id for patient in sorted(patients, key=lambda p: (p.updated, p.id))]
+
+    def test_invalid_cursor_returns_404(self, user_client):
+        response = user_client.get(self.url, {'cursor': 'invalid'})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestListPatientCache:
+    url = reverse('patient-list')
+
+    def test_repeated_list_served_from_cache(self, user_client, user_patient, django_assert_num_queries):
+        first = user_client.get(self.url)
+
+        with django_assert_num_queries(0):
+            second = user_client.get(self.url)
+
+        assert second.status_code == status.HTTP_200_OK
+        assert second.data == first.data
+        assert second['ETag'] == first['ETag']
+
+    def test_cached_page_answers_not_modified(self, user_client, user_patient, django_assert_num_queries):
+        etag = user_client.get(self.url)['ETag']
+
+        with django_assert_num_queries(0):
+            response = user_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_patient_change_invalidates(self, user_client, user_patient):
+        user_client.get(self.url)
+
+        user_patient.first_name = 'changed'
+        user_patient.save()
+        response = user_client.get(self.url)
+
+        assert response.data['results'][0]['first_name'] == 'changed'
+
+    def test_material_change_invalidates(self, user_client, user_patient):
+        user_client.get(self.url)
+
+        baker.make(Material, patient=user_patient)
+        with CaptureQueriesContext(connection) as queries:
+            user_client.get(self.url)
+
+        assert len(queries) > 0
+
+    def test_reassigned_patient_leaves_previous_doctor_list(self, user_client, user_patient, admin_user):
+        user_client.get(self.url)
+
+        patient = Patient.objects.get(id=user_patient.id)
+        patient.doctor = admin_user.profile
+        patient.save()
+        response = user_client.get(self.url)
+
+        assert response.data['results'] == []
+
+    def test_bulk_create_invalidates(self, user_client, user, patient_data):
+        user_client.get(self.url)
+
+        user_client.post(reverse('patient-bulk'), data=[patient_data] * 2, format='json')
+        response = user_client.get(self.url)
+
+        assert len(response.data['results']) == 2
+
+    def test_cache_stats_if_user_not_admin_returns_403(self, user_client):
+        response = user_client.get(reverse('patient-cache-stats'))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_cache_stats(self, admin_client, user_patient):
+        before = admin_client.get(reverse('patient-cache-stats')).data
+        admin_client.get(self.url)
+        admin_client.get(self.url)
+
+        response = admin_client.get(reverse('patient-cache-stats'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['hits'] - before['hits'] == 1
+        assert response.data['misses'] - before['misses'] == 1
+
+
+@pytest.mark.django_db
+class TestSearchPatient:
+    url = reverse('patient-list')
+
+    def test_search_matches_med_condition(self, user_client, user):
+        asthma_patient = baker.make(Patient, doctor=user.profile, med_condition='Chronic asthma since childhood')
+        baker.make(Patient, doctor=user.profile, med_condition='Broken leg')
+
+        response = user_client.get(self.url, {'search': 'asthma'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [patient['id'] for patient in response.data['results']] == [asthma_patient.id]
+
+    def test_search_requires_all_terms(self, user_client, user):
+        patient = baker.make(Patient, doctor=user.profile, first_name='John', last_name='Smith')
+        baker.make(Patient, doctor=user.profile, first_name='John', last_name='Doe')
+
+        response = user_client.get(self.url, {'search': 'john smith'})
+
+        assert [patient['id'] for patient in response.data['results']] == [patient.id]
+
+    def test_name_match_ranks_above_condition_match(self, user_client, user):
+        condition_match = baker.make(Patient, doctor=user.profile, first_name='Anna', med_condition='Examined by Dr. Parker')
+        name_match = baker.make(Patient, doctor=user.profile, first_name='Parker', med_condition='Flu')
+
+        response = user_client.get(self.url, {'search': 'parker'})
+
+        assert [patient['id'] for patient in response.data['results']] == [name_match.id, condition_match.id]
+
+    def test_search_reflects_updates(self, user_client, user_patient):
+        user_patient.med_condition = 'Diabetes type 2'
+        user_patient.save()
+
+        response = user_client.get(self.url, {'search': 'diabetes'})
+
+        assert [patient['id'] for patient in response.data['results']] == [user_patient.id]
+
+    def test_search_only_relateds(self, user_client, admin_user):
+        baker.make(Patient, doctor=admin_user.profile, med_condition='asthma')
+
+        response = user_client.get(self.url, {'search': 'asthma'})
+
+        assert response.data['results'] == []
+
+
+@pytest.mark.django_db
+class TestAutocompletePatient:
+    url = reverse('patient-autocomplete')
+
+    def test_if_user_anonymous_returns_401(self, client):
+        response = client.get(self.url, {'q': 'jo'})
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_prefix_matches_names(self, user_client, user):
+        patient = baker.make(Patient, doctor=user.profile, first_name='John', last_name='Smith')
+        baker.make(Patient, doctor=user.profile, first_name='Anna', last_name='Johnson')
+
+        response = user_client.get(self.url, {'q': 'jo sm'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == [{'id': patient.id, 'full_name': 'John Smith'}]
+
+    def test_results_are_limited(self, user_client, user):
+        baker.make(Patient, 15, doctor=user.profile, first_name='Mary')
+
+        response = user_client.get(self.url, {'q': 'mar'})
+
+        assert len(response.data) == 10
+
+    def test_empty_query_returns_empty_list(self, user_client, user_patient):
+        response = user_client.get(self.url)
+
+        assert response.data == []
+
+    def test_only_relateds(self, user_client, admin_user):
+        baker.make(Patient, doctor=admin_user.profile, first_name='John')
+
+        response = user_client.get(self.url, {'q': 'john'})
+
+        assert response.data == []
+
+
+@pytest.mark.django_db
+class TestExportPatient:
+    url = reverse('patient-export')
+
+    @staticmethod
+    def read(response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_if_user_anonymous_returns_401(self, client):
+        response = client.get(self.url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_ndjson_export_only_relateds(self, user_client, user, admin_user):
+        patients = baker.make(Patient, 3, doctor=user.profile)
+        baker.make(Patient, 2, doctor=admin_user.profile)
+
+        response = user_client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        assert sorted(row['id'] for row in rows) == sorted(patient.id for patient in patients)
+        assert 'doctor_id' not in rows[0]
+
+    def test_ndjson_rows_match_serializer(self, user_client, user_patient):
+        detail = user_client.get(reverse('patient-detail', args=[user_patient.id])).data
+
+        response = user_client.get(self.url)
+
+        assert json.loads(self.read(response)) == json.loads(json.dumps(detail))
+
+    def test_csv_export(self, user_client, user_patient):
+        response = user_client.get(self.url, {'format': 'csv'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/csv')
+        rows = list(csv.DictReader(self.read(response).splitlines()))
+        assert len(rows) == 1
+        assert rows[0]['id'] == str(user_patient.id)
+        assert rows[0]['med_condition'] == user_patient.med_condition
+
+    def test_admin_export_includes_doctor(self, admin_client, user_patient):
+        response = admin_client.get(self.url, HTTP_ACCEPT='text/csv')
+
+        rows = list(csv.DictReader(self.read(response).splitlines()))
+        assert rows[0]['doctor_id'] == str(user_patient.doctor_id)
+
+    def test_export_applies_search(self, user_client, user):
+        patient = baker.make(Patient, doctor=user.profile, med_condition='asthma')
+        baker.make(Patient, doctor=user.profile, med_condition='fracture')
+
+        response = user_client.get(self.url, {'search': 'asthma'})
+
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        assert [row['id'] for row in rows] == [patient.id]
+
+
+@pytest.mark.django_db
+class TestBulkPatient:
+    url = reverse('patient-bulk')
+
+    def test_if_user_anonymous_returns_401(self, client):
+        response = client.post(self.url, data=[], format='json')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_bulk_create_with_not_admin_user(self, user_client, user, patient_data):
+        response = user_client.post(self.url, data=[patient_data] * 5, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(response.data) == 5
+        assert Patient.objects.filter(doctor=user.profile).count() == 5
+
+    def test_bulk_create_queries_do_not_grow_with_rows(self, user_client, user, patient_data, django_assert_max_num_queries):
+        with django_assert_max_num_queries(5):
+            response = user_client.post(self.url, data=[patient_data] * 50, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+
+    def test_bulk_create_with_admin_user_queries_do_not_grow_with_rows(
+        self, admin_client, user, admin_user, patient_data, django_assert_max_num_queries
+    ):
+        rows = [{**patient_data, 'doctor': profile.id} for profile in [user.profile, admin_user.profile] * 25]
+
+        with django_assert_max_num_queries(5):
+            response = admin_client.post(self.url, data=rows, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert [row['doctor'] for row in response.data] == [row['doctor'] for row in rows]
+        assert Patient.objects.filter(doctor=user.profile).count() == 25
+
+    def test_bulk_with_admin_user_unknown_doctor(self, admin_client, user, patient_data):
+        rows = [{**patient_data, 'doctor': user.profile.id}, {**patient_data, 'doctor': 99999}]
+
+        response = admin_client.post(self.url, data=rows, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data[0] == {}
+        assert 'doctor' in response.data[1]
+        assert not Patient.objects.exists()
+
+    def test_bulk_create_and_update(self, user_client, user_patient, patient_data):
+        old_updated = user_patient.updated
+        rows = [patient_data, {**patient_data, 'id': user_patient.id, 'first_name': 'changed'}]
+
+        response = user_client.post(self.url, data=rows, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data[1]['id'] == user_patient.id
+        user_patient.refresh_from_db()
+        assert user_patient.first_name == 'changed'
+        assert user_patient.updated > old_updated
+
+    def test_per_row_errors_and_nothing_written(self, user_client, user, patient_data):
+        rows = [patient_data, {**patient_data, 'gender': 'X'}, {**patient_data, 'id': 99999}]
+
+        response = user_client.post(self.url, data=rows, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data[0] == {}
+        assert 'gender' in response.data[1]
+        assert 'id' in response.data[2]
+        assert not Patient.objects.filter(doctor=user.profile).exists()
+
+    def test_update_non_related_not_found(self, user_client, admin_patient, patient_data):
+        response = user_client.post(self.url, data=[{**patient_data, 'id': admin_patient.id}], format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'id' in response.data[0]
+
+    def test_bulk_create_with_admin_user_requires_doctor(self, admin_client, user, patient_data):
+        rows = [{**patient_data, 'doctor': user.profile.id}, patient_data]
+
+        response = admin_client.post(self.url, data=rows, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'doctor' in response.data[1]
+
+    def test_bulk_create_from_ndjson(self, user_client, user, patient_data):
+        body = '\n'.join(json.dumps(patient_data) for _ in range(3))
+
+        response = user_client.post(self.url, data=body, content_type='application/x-ndjson')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Patient.objects.filter(doctor=user.profile).count() == 3
+
+
+@pytest.mark.django_db
+class TestSyncPatient:
+    url = reverse('patient-sync')
+
+    @pytest.fixture(autouse=True)
+    def no_sync_lag(self, settings):
+        settings.SYNC_SAFETY_LAG = 0
+
+    def test_if_user_anonymous_returns_401(self, client):
+        response = client.get(self.url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_full_snapshot_without_watermark(self, user_client, user, admin_user):
+        patients = baker.make(Patient, 3, doctor=user.profile)
+        baker.make(Patient, 2, doctor=admin_user.profile)
+
+        response = user_client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(patient['id'] for patient in response.data['results']) == sorted(p.id for p in patients)
+        assert response.data['deleted'] == []
+        assert response.data['has_more'] is False
+
+    def test_returns_only_changes_after_watermark(self, user_client, user):
+        unchanged, changed = baker.make(Patient, 2, doctor=user.profile)
+        watermark = user_client.get(self.url).data['next']
+
+        changed.first_name = 'changed'
+        changed.save()
+        response = user_client.get(self.url, watermark)
+
+        assert [patient['id'] for patient in response.data['results']] == [changed.id]
+
+    def test_returns_tombstones_of_relateds(self, user_client, user_patient, admin_patient):
+        material = baker.make(Material, patient=user_patient)
+        other_patient = baker.make(Patient, doctor=user_patient.doctor)
+        material_id, other_patient_id = material.id, other_patient.id
+        watermark = user_client.get(self.url).data['next']
+
+        material.delete()
+        other_patient.delete()
+        admin_patient.delete()
+        response = user_client.get(self.url, watermark)
+
+        # Material stats of the patient changed
+        assert [(row['id'], row['materials_count']) for row in response.data['results']] == [(user_patient.id, 0)]
+        assert [(row['model'], row['object_id'], row['patient_id']) for row in response.data['deleted']] == [
+            ('material', material_id, user_patient.id),
+            ('patient', other_patient_id, other_patient_id),
+        ]
+
+    def test_pages_follow_watermark(self, user_client, user, monkeypatch):
+        monkeypatch.setattr(PatientViewSet, 'sync_page_size', 2)
+        patients = baker.make(Patient, 5, doctor=user.profile)
+
+        seen_ids = []
+        response = user_client.get(self.url)
+        seen_ids += [patient['id'] for patient in response.data['results']]
+        while response.data['has_more']:
+            response = user_client.get(self.url, response.data['next'])
+            seen_ids += [patient['id'] for patient in response.data['results']]
+
+        assert seen_ids == [patient.id for patient in sorted(patients, key=lambda p: (p.updated, p.id))]
+
+    def test_invalid_watermark_returns_400(self, user_client):
+        response = user_client.get(self.url, {'updated_since': 'yesterday'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_recent_changes_left_for_next_sync(self, user_client, user, settings):
+        settings.SYNC_SAFETY_LAG = 60
+        baker.make(Patient, doctor=user.profile)
+
+        response = user_client.get(self.url)
+
+        assert response.data['results'] == []
+        since = datetime.fromisoformat(response.data['next']['updated_since'].replace('Z', '+00:00'))
+        assert since <= timezone.now() - timedelta(seconds=60)
+
+    def test_reassigned_patient_tombstone_for_previous_doctor(self, client, user, admin_user, user_patient):
+        client.force_authenticate(user=user)
+        user_watermark = client.get(self.url).data['next']
+        client.force_authenticate(user=admin_user)
+        admin_watermark = client.get(self.url).data['next']
+
+        response = client.patch(
+            reverse('patient-detail', args=[user_patient.id]), {'doctor': admin_user.profile.id}, format='json'
+        )
+        assert response.status_code == status.HTTP_200_OK
+        admin_response = client.get(self.url, admin_watermark)
+        client.force_authenticate(user=user)
+        user_response = client.get(self.url, user_watermark)
+
+        assert [(row['model'], row['object_id']) for row in user_response.data['deleted']] == [
+            ('patient', user_patient.id),
+        ]
+        # Staff scope still holds the patient
+        assert admin_response.data['deleted'] == []
+        assert [row['id'] for row in admin_response.data['results']] == [user_patient.id]
+
+    def test_bulk_reassigned_patient_tombstone(self, admin_client, user, admin_user, user_patient, patient_data):
+        row = {**patient_data, 'id': user_patient.id, 'doctor': admin_user.profile.id}
+
+        response = admin_client.post(reverse('patient-bulk'), data=[row], format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert list(Tombstone.objects.values_list('model', 'object_id', 'doctor_id')) == [
+            ('patient', user_patient.id, user.profile.id),
+        ]
+
+    def test_expired_watermark_returns_400(self, user_client, settings):
+        settings.TOMBSTONE_RETENTION_DAYS = 30
+        since = timezone.now() - timedelta(days=31)
+
+        response = user_client.get(self.url, {'updated_since': since.isoformat()})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'updated_since' in response.data
+
+    def test_prune_command_deletes_expired_tombstones(self, user_patient):
+        material = baker.make(Material, patient=user_patient)
+        material.delete()
+        user_patient.delete()
+        expired, kept = Tombstone.objects.all()
+        Tombstone.objects.filter(id=expired.id).update(deleted=timezone.now() - timedelta(days=31))
+        out = io.StringIO()
+
+        call_command('prune_tombstones', days=30, batch_size=1, stdout=out)
+
+        assert list(Tombstone.objects.all()) == [kept]
+        assert '1 tombstones deleted' in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestSparseFieldsetPatient:
+    list_url = reverse('patient-list')
+
+    @classmethod
+    def get_select_sql(cls, queries):
+        # Selected columns and joins of the page query
+        sql = next(query['sql'] for query in queries if 'FROM "api_patient"' in query['sql'] and 'COUNT' not in query['sql'])
+        return sql.split(' ORDER BY ')[0]
+
+    def test_list_renders_and_loads_only_requested(self, user_client, user_patient):
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.get(self.list_url, {'fields': 'id,first_name'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'] == [{'id': user_patient.id, 'first_name': user_patient.first_name}]
+        sql = self.get_select_sql(context.captured_queries)
+        assert '"med_condition"' not in sql
+        assert '"last_name"' not in sql
+
+    def test_nested_fields_of_admin(self, admin_client, user_patient):
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.get(self.list_url, {'fields': 'id,doctor.full_name'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'] == [{'id': user_patient.id, 'doctor': {'full_name': ''}}]
+        sql = self.get_select_sql(context.captured_queries)
+        assert '"med_condition"' not in sql
+        assert '"company_name"' not in sql
+        assert '"password"' not in sql
+
+    def test_admin_without_doctor_skips_join(self, admin_client, user_patient):
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.get(self.list_url, {'fields': 'last_name'})
+
+        assert response.data['results'] == [{'last_name': user_patient.last_name}]
+        assert 'JOIN' not in self.get_select_sql(context.captured_queries)
+
+    def test_retrieve(self, user_client, user_patient):
+        response = user_client.get(reverse('patient-detail', args=[user_patient.id]), {'fields': 'materials_count'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'materials_count': 0}
+
+    def test_keyset_pagination(self, user_client, user):
+        baker.make(Patient, 3, doctor=user.profile)
+
+        response = user_client.get(self.list_url, {'fields': 'id', 'cursor': ''})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 3
+
+    @pytest.mark.parametrize('fields', ['unknown', 'first_name.unknown'])
+    def test_invalid_fields_returns_400(self, admin_client, user_patient, fields):
+        response = admin_client.get(self.list_url, {'fields': fields})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'fields' in response.data
+
 
 @pytest.mark.django_db
 class TestRetrievePatient:
@@ -86,6 +629,206 @@ class TestRetrievePatient:
         assert response.data['id'] == user_patient.id
 
 
+@pytest.mark.django_db
+class TestPatientMaterialStats:
+    list_url = reverse('patient-list')
+
+    def test_material_create_and_delete(self, user_patient):
+        first, second = baker.make(Material, 2, patient=user_patient)
+
+        user_patient.refresh_from_db()
+        assert user_patient.materials_count == 2
+        assert user_patient.last_material_at == second.created
+
+        second.delete()
+        user_patient.refresh_from_db()
+        assert user_patient.materials_count == 1
+        assert user_patient.last_material_at == first.created
+
+        first.delete()
+        user_patient.refresh_from_db()
+        assert user_patient.materials_count == 0
+        assert user_patient.last_material_at is None
+
+    def test_queryset_delete_of_materials(self, user_patient):
+        baker.make(Material, 2, patient=user_patient)
+
+        Material.objects.filter(patient=user_patient).delete()
+
+        user_patient.refresh_from_db()
+        assert (user_patient.materials_count, user_patient.last_material_at) == (0, None)
+
+    def test_patient_delete_skips_stats_of_cascaded_materials(self, user_patient):
+        baker.make(Material, 3, patient=user_patient)
+
+        with CaptureQueriesContext(connection) as context:
+            user_patient.delete()
+
+        assert not [query for query in context.captured_queries if query['sql'].startswith('UPDATE "api_patient"')]
+
+    def test_material_moved_to_other_patient(self, user_patient, admin_patient):
+        material = baker.make(Material, patient=user_patient)
+
+        material.patient = admin_patient
+        material.save()
+
+        user_patient.refresh_from_db()
+        admin_patient.refresh_from_db()
+        assert (user_patient.materials_count, user_patient.last_material_at) == (0, None)
+        assert (admin_patient.materials_count, admin_patient.last_material_at) == (1, material.created)
+
+    def test_material_change_modifies_patient(self, user_client, user_patient):
+        url = reverse('patient-detail', args=[user_patient.id])
+        etag = user_client.get(url)['ETag']
+
+        baker.make(Material, patient=user_patient)
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['materials_count'] == 1
+
+    def test_ordering_by_materials_count(self, user_client, user):
+        patients = baker.make(Patient, 3, doctor=user.profile)
+        baker.make(Material, 2, patient=patients[0])
+        baker.make(Material, patient=patients[2])
+
+        response = user_client.get(self.list_url, {'ordering': '-materials_count'})
+
+        assert [patient['id'] for patient in response.data['results']] == [patients[0].id, patients[2].id, patients[1].id]
+        assert [patient['materials_count'] for patient in response.data['results']] == [2, 1, 0]
+
+    def test_recompute_command_fixes_drift(self, user_patient, admin_patient):
+        material = baker.make(Material, patient=user_patient)
+        Patient.objects.filter(id=user_patient.id).update(materials_count=5, last_material_at=None)
+        out = io.StringIO()
+
+        call_command('recompute_material_stats', batch_size=1, stdout=out)
+
+        user_patient.refresh_from_db()
+        assert (user_patient.materials_count, user_patient.last_material_at) == (1, material.created)
+        assert '2 patients checked, 1 fixed' in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestConditionalGetPatient:
+    list_url = reverse('patient-list')
+
+    def test_retrieve_not_modified_with_etag(self, user_client, user_patient):
+        url = reverse('patient-detail', args=[user_patient.id])
+        etag = user_client.get(url)['ETag']
+
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_retrieve_modified_after_update(self, user_client, user_patient):
+        url = reverse('patient-detail', args=[user_patient.id])
+        etag = user_client.get(url)['ETag']
+
+        user_patient.first_name = 'changed'
+        user_patient.save()
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['first_name'] == 'changed'
+
+    def test_retrieve_not_modified_since(self, user_client, user_patient):
+        url = reverse('patient-detail', args=[user_patient.id])
+        last_modified = user_client.get(url)['Last-Modified']
+
+        response = user_client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_list_not_modified_with_etag(self, user_client, user_patient):
+        etag = user_client.get(self.list_url)['ETag']
+
+        response = user_client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert 'Authorization' in response['Vary']
+
+    def test_list_count_read_once(self, user_client, user, django_assert_num_queries):
+        baker.make(Patient, 3, doctor=user.profile)
+
+        # aggregate with count, page
+        with django_assert_num_queries(2):
+            response = user_client.get(self.list_url)
+
+        assert response.data['count'] == 3
+
+    def test_list_not_modified_without_serialization(
+        self, user_client, user, settings, monkeypatch, django_assert_max_num_queries
+    ):
+        # Cached pages skip the database, validators are read without the cache
+        settings.PATIENT_LIST_CACHE_TIMEOUT = 0
+        baker.make(Patient, 3, doctor=user.profile)
+        etag = user_client.get(self.list_url)['ETag']
+
+        monkeypatch.setattr(mixins, 'compile_serializer', lambda *args: pytest.fail('serialized'))
+        monkeypatch.setattr(PatientSerializer, 'to_representation', lambda *args: pytest.fail('serialized'))
+        with django_assert_max_num_queries(1):
+            response = user_client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_cursor_page_validated_by_window(self, user_client, user, settings, monkeypatch):
+        settings.PATIENT_LIST_CACHE_TIMEOUT = 0
+        baker.make(Patient, 3, doctor=user.profile)
+        etag = user_client.get(self.list_url, {'cursor': ''})['ETag']
+        monkeypatch.setattr(mixins, 'compile_serializer', lambda *args: pytest.fail('serialized'))
+        monkeypatch.setattr(PatientSerializer, 'to_representation', lambda *args: pytest.fail('serialized'))
+
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.get(self.list_url, {'cursor': ''}, HTTP_IF_NONE_MATCH=etag)
+
+        # Only (id, updated) of the keyset page, no count nor aggregate
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert len(context.captured_queries) == 1
+        assert 'COUNT(' not in context.captured_queries[0]['sql']
+
+    def test_cursor_page_not_modified_with_etag(self, user_client, user_patient):
+        etag = user_client.get(self.list_url, {'cursor': ''})['ETag']
+
+        response = user_client.get(self.list_url, {'cursor': ''}, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_cursor_page_modified_after_update(self, user_client, user_patient):
+        etag = user_client.get(self.list_url, {'cursor': ''})['ETag']
+
+        user_patient.first_name = 'changed'
+        user_patient.save()
+        response = user_client.get(self.list_url, {'cursor': ''}, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_list_modified_after_delete(self, user_client, user):
+        patients = baker.make(Patient, 2, doctor=user.profile)
+        etag = user_client.get(self.list_url)['ETag']
+
+        patients[0].delete()
+        response = user_client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_list_etag_depends_on_query(self, user_client, user_patient):
+        etag = user_client.get(self.list_url)['ETag']
+
+        response = user_client.get(self.list_url, {'search': 'x'}, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_list_etag_depends_on_user(self, user_client, admin_user, user_patient):
+        etag = user_client.get(self.list_url)['ETag']
+        admin_client = APIClient()
+        admin_client.force_authenticate(user=admin_user)
+
+        response = admin_client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+
 @pytest.mark.django_db
 class TestUpdatePatient:
     url_name = 'patient-detail'
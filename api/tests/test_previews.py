@@ -0,0 +1,208 @@
+import io
+import shutil
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+import pytest
+from PIL import Image
+
+from api import jobs
+from api.models import Job, Material
+
+
+@pytest.fixture(autouse=True)
+def thumbnail_size(settings):
+    settings.MATERIAL_THUMBNAIL_SIZE = 64
+
+@pytest.fixture
+def image_content():
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def failing_job(settings):
+    settings.JOB_MAX_ATTEMPTS = 2
+    calls = []
+
+    def fail(**payload):
+        raise ValueError('broken')
+
+    jobs.register('test_failing', on_failure=lambda **payload: calls.append(payload))(fail)
+    yield jobs.enqueue('test_failing', value=1), calls
+    del jobs.handlers['test_failing']
+
+
+@pytest.mark.django_db
+class TestJobs:
+
+    def test_material_create_enqueues_preview(self, make_material, user_patient, image_content):
+        material = make_material(user_patient, image_content, 'xray.png')
+
+        assert material.preview_status == Material.PreviewStatusChoice.PENDING
+        assert Job.objects.filter(name='material_preview', payload={'material_id': material.id}).count() == 1
+
+    def test_material_update_without_file_change_not_enqueued(self, make_material, user_patient, image_content):
+        material = make_material(user_patient, image_content, 'xray.png')
+        Job.objects.all().delete()
+
+        material.save()
+
+        assert not Job.objects.exists()
+
+    def test_no_due_job(self):
+        jobs.enqueue('material_preview', material_id=1).__class__.objects.update(
+            run_after=timezone.now() + timedelta(minutes=1),
+        )
+
+        assert jobs.run_next() is False
+
+    def test_unknown_job_failed(self):
+        job = jobs.enqueue('unknown')
+
+        assert jobs.run_next() is True
+        job.refresh_from_db()
+        assert job.status == Job.StatusChoice.FAILED
+
+    def test_failed_job_retried_later(self, failing_job):
+        job, calls = failing_job
+
+        jobs.run_next()
+
+        job.refresh_from_db()
+        assert job.status == Job.StatusChoice.PENDING
+        assert job.attempts == 1
+        assert job.run_after > timezone.now()
+        assert 'ValueError: broken' in job.last_error
+        assert calls == []
+
+    def test_last_attempt_marks_failed(self, failing_job):
+        job, calls = failing_job
+        Job.objects.filter(id=job.id).update(attempts=1)
+
+        jobs.run_next()
+
+        job.refresh_from_db()
+        assert job.status == Job.StatusChoice.FAILED
+        assert calls == [{'value': 1}]
+
+
+@pytest.mark.django_db
+class TestMaterialPreview:
+
+    def test_image_thumbnail(self, make_material, user_patient, image_content):
+        material = make_material(user_patient, image_content, 'xray.png')
+
+        call_command('run_jobs', once=True)
+
+        material.refresh_from_db()
+        assert material.preview_status == Material.PreviewStatusChoice.READY
+        with Image.open(material.thumbnail) as thumbnail:
+            assert thumbnail.format == 'JPEG'
+            assert thumbnail.size == (64, 48)
+        assert not Job.objects.exists()
+
+    def test_unsupported_file(self, make_material, user_patient):
+        material = make_material(user_patient, b'plain text notes', 'notes.txt')
+
+        call_command('run_jobs', once=True)
+
+        material.refresh_from_db()
+        assert material.preview_status == Material.PreviewStatusChoice.UNSUPPORTED
+        assert not material.thumbnail
+
+    @pytest.mark.skipif(shutil.which('pdftoppm') is None, reason='pdftoppm is not installed')
+    def test_pdf_thumbnail(self, make_material, user_patient, image_content):
+        buffer = io.BytesIO()
+        Image.open(io.BytesIO(image_content)).save(buffer, 'PDF')
+        material = make_material(user_patient, buffer.getvalue(), 'scan.pdf')
+
+        call_command('run_jobs', once=True)
+
+        material.refresh_from_db()
+        assert material.preview_status == Material.PreviewStatusChoice.READY
+
+    def test_failed_preview_marks_material(self, make_material, settings, user_patient, image_content, monkeypatch):
+        settings.JOB_MAX_ATTEMPTS = 1
+        material = make_material(user_patient, image_content, 'xray.png')
+        monkeypatch.setattr('api.previews.make_thumbnail', lambda image: 1 / 0)
+
+        call_command('run_jobs', once=True)
+
+        material.refresh_from_db()
+        assert material.preview_status == Material.PreviewStatusChoice.FAILED
+        assert Job.objects.get().status == Job.StatusChoice.FAILED
+
+    def test_thumbnail_deleted_with_material(
+        self, make_material, user_patient, image_content, django_capture_on_commit_callbacks
+    ):
+        material = make_material(user_patient, image_content, 'xray.png')
+        call_command('run_jobs', once=True)
+        material.refresh_from_db()
+        storage, name = material.thumbnail.storage, material.thumbnail.name
+
+        with django_capture_on_commit_callbacks(execute=True):
+            material.delete()
+
+        assert not storage.exists(name)
+
+    def test_thumbnail_kept_when_delete_rolls_back(self, make_material, user_patient, image_content):
+        material = make_material(user_patient, image_content, 'xray.png')
+        call_command('run_jobs', once=True)
+        material.refresh_from_db()
+
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                material.delete()
+                raise RuntimeError
+
+        assert material.thumbnail.storage.exists(material.thumbnail.name)
+
+
+@pytest.mark.django_db
+class TestThumbnailEndpoint:
+
+    @classmethod
+    def get_url(cls, material):
+        return reverse('material-thumbnail', kwargs={'patient_pk': material.patient_id, 'pk': material.id})
+
+    def test_pending_returns_404(self, make_material, user_client, user_patient, image_content):
+        material = make_material(user_patient, image_content, 'xray.png')
+
+        response = user_client.get(self.get_url(material))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_non_relative_returns_404(self, make_material, user_client, admin_patient, image_content):
+        material = make_material(admin_patient, image_content, 'xray.png')
+        call_command('run_jobs', once=True)
+
+        response = user_client.get(self.get_url(material))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_success(self, make_material, user_client, user_patient, image_content):
+        material = make_material(user_patient, image_content, 'xray.png')
+        call_command('run_jobs', once=True)
+
+        response = user_client.get(self.get_url(material))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'image/jpeg'
+        assert response['Content-Disposition'].startswith('inline')
+
+    def test_thumbnail_url_in_detail(self, make_material, user_client, user_patient, image_content):
+        material = make_material(user_patient, image_content, 'xray.png')
+        detail_url = reverse('material-detail', kwargs={'patient_pk': user_patient.id, 'pk': material.id})
+
+        assert user_client.get(detail_url).data['thumbnail_url'] is None
+
+        call_command('run_jobs', once=True)
+        data = user_client.get(detail_url).data
+
+        assert data['preview_status'] == Material.PreviewStatusChoice.READY
+        assert data['thumbnail_url'].endswith(self.get_url(material))
@@ -38,6 +38,14 @@ class TestListProfile:
 
         assert response.status_code == status.HTTP_200_OK
 
+    def test_sparse_fieldset(self, admin_client, django_assert_num_queries):
+        # count, page
+        with django_assert_num_queries(2):
+            response = admin_client.get(self.url, {'fields': 'id,full_name'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert set(response.data['results'][0]) == {'id', 'full_name'}
+
 
 @pytest.mark.django_db
 class TestRetrieveProfile:
@@ -49,6 +57,12 @@ class TestRetrieveProfile:
         assert response.status_code == status.HTTP_200_OK
         assert response.data == ProfileSerializer(user.profile).data
 
+    def test_retrieve_profile_me_sparse_fieldset(self, user_client, user):
+        response = user_client.get(self.url, {'fields': 'company_name'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'company_name': user.profile.company_name}
+
     def test_if_user_anonymous_returns_401(self, client):
         response = client.get(self.url)
 
@@ -0,0 +1,90 @@
+import datetime
+import decimal
+import uuid
+
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+import pytest
+
+from api import renderers
+from api.renderers import FastJSONRenderer, NDJSONRenderer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DATA = {
+    'created': datetime.datetime(2023, 5, 17, 8, 30, 1, 250, tzinfo=datetime.timezone.utc),
+    'updated': datetime.datetime(2023, 5, 17, 8, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=5))),
+    'naive': datetime.datetime(2023, 5, 17, 8, 30),
+    'birth_date': datetime.date(1990, 1, 2),
+    'time': datetime.time(10, 15),
+    'duration': datetime.timedelta(minutes=2),
+    'amount': decimal.Decimal('1.50'),
+    'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'lazy': gettext_lazy('Not found.'),
+    'detail': ErrorDetail('Invalid page.', code='invalid'),
+    'text': 'Ünïcode line separator',
+    'nested': [{1: None, 'ok': True}],
+}
+
+
+class TestFastJSONRenderer:
+
+    def test_same_output_as_json_renderer(self):
+        assert FastJSONRenderer().render(DATA) == JSONRenderer().render(DATA)
+
+    def test_without_orjson(self, monkeypatch):
+        monkeypatch.setattr(renderers, 'orjson', None)
+
+        assert FastJSONRenderer().render(DATA) == JSONRenderer().render(DATA)
+
+    def test_indent_falls_back(self):
+        accepted_media_type = 'application/json; indent=2'
+
+        assert FastJSONRenderer().render(DATA, accepted_media_type) == JSONRenderer().render(DATA, accepted_media_type)
+
+    def test_ndjson_row_same_as_without_orjson(self, monkeypatch):
+        row = NDJSONRenderer().encode_row(DATA, list(DATA))
+        monkeypatch.setattr(renderers, 'orjson', None)
+
+        assert row == NDJSONRenderer().encode_row(DATA, list(DATA))
+
+
+@pytest.mark.skipif(msgpack is None, reason='msgpack is not installed')
+@pytest.mark.django_db
+class TestMessagePack:
+    url = reverse('patient-list')
+
+    def test_list_as_msgpack(self, user_client, user_patient):
+        json_data = user_client.get(self.url).json()
+
+        response = user_client.get(self.url, HTTP_ACCEPT='application/msgpack')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/msgpack'
+        assert msgpack.unpackb(response.content) == json_data
+
+    def test_create_from_msgpack(self, user_client, patient_data):
+        response = user_client.post(
+            self.url,
+            msgpack.packb(patient_data),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert msgpack.unpackb(response.content)['first_name'] == patient_data['first_name']
+
+    def test_invalid_msgpack_returns_400(self, user_client):
+        response = user_client.post(self.url, b'\xc1', content_type='application/msgpack')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_datetimes_as_in_json(self):
+        assert msgpack.unpackb(renderers.MessagePackRenderer().render({'at': timezone.now()}))['at'].endswith('Z')
@@ -0,0 +1,133 @@
+import hashlib
+import threading
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from django.urls import reverse
+from rest_framework import status
+import pytest
+
+from api.models import Material
+from api.storage import get_material_storage
+
+
+CONTENT = b'%PDF-1.4 lab results'
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.mark.django_db
+class TestContentAddressedStorage:
+
+    def test_sharded_blob_name(self, make_material, user_patient):
+        material = make_material(user_patient, CONTENT)
+
+        assert material.file.name == f'blobs/{SHA256[:2]}/{SHA256[2:4]}/{SHA256}'
+        assert material.name == 'labs.pdf'
+        assert material.file.read() == CONTENT
+
+    def test_equal_content_stored_once(self, make_material, user_patient, admin_patient):
+        first = make_material(user_patient, CONTENT, name='labs.pdf')
+        second = make_material(admin_patient, CONTENT, name='copy.pdf')
+
+        assert first.file.name == second.file.name
+        assert second.name == 'copy.pdf'
+        assert len(get_material_storage().listdir(f'blobs/{SHA256[:2]}/{SHA256[2:4]}')[1]) == 1
+
+    def test_blob_kept_while_referenced(self, make_material, user_patient, admin_patient, django_capture_on_commit_callbacks):
+        first = make_material(user_patient, CONTENT)
+        second = make_material(admin_patient, CONTENT)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            first.delete()
+        assert get_material_storage().exists(second.file.name)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            second.delete()
+        assert not get_material_storage().exists(second.file.name)
+
+    def test_blob_deleted_with_patient(self, make_material, user_patient, django_capture_on_commit_callbacks):
+        material = make_material(user_patient, CONTENT)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            user_patient.delete()
+
+        assert not get_material_storage().exists(material.file.name)
+
+    def test_replaced_file_releases_blob(self, make_material, user_client, user_patient, django_capture_on_commit_callbacks):
+        material = make_material(user_patient, CONTENT)
+        old_name = material.file.name
+        url = reverse('material-detail', kwargs={'patient_pk': user_patient.id, 'pk': material.id})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = user_client.put(url, data={'file': SimpleUploadedFile('new.pdf', b'new')})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['name'] == 'new.pdf'
+        assert not get_material_storage().exists(old_name)
+
+    def test_download_uses_original_name(self, make_material, user_client, user_patient):
+        material = make_material(user_patient, CONTENT)
+        url = reverse('material-download', kwargs={'patient_pk': user_patient.id, 'pk': material.id})
+
+        response = user_client.get(url)
+
+        assert response['Content-Disposition'] == 'attachment; filename="labs.pdf"'
+
+    def test_chunked_upload_of_duplicate(self, make_material, settings, user_client, user_patient):
+        settings.MATERIAL_UPLOAD_CHUNK_SIZE = len(CONTENT)
+        existing = make_material(user_patient, CONTENT)
+        upload_id = user_client.post(
+            reverse('material-upload-list', kwargs={'patient_pk': user_patient.id}),
+            data={'filename': 'again.pdf', 'size': len(CONTENT), 'sha256': SHA256},
+        ).data['id']
+        upload_url = reverse('material-upload-detail', kwargs={'patient_pk': user_patient.id, 'pk': upload_id})
+        user_client.put(f'{upload_url}?offset=0', data=CONTENT, content_type='application/octet-stream')
+
+        response = user_client.post(
+            reverse('material-upload-finalize', kwargs={'patient_pk': user_patient.id, 'pk': upload_id})
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        material = Material.objects.get(id=response.data['id'])
+        assert material.file.name == existing.file.name
+        assert material.name == 'again.pdf'
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentBlobRelease:
+
+    def test_blob_kept_for_material_committed_during_release(self, make_material, user_patient, admin_patient):
+        existing = make_material(user_patient, CONTENT)
+        adopted, commit = threading.Event(), threading.Event()
+        errors = []
+
+        def run(func):
+            try:
+                func()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        def save_duplicate():
+            with transaction.atomic():
+                make_material(admin_patient, CONTENT, name='copy.pdf')
+                adopted.set()
+                commit.wait(5)
+
+        saver = threading.Thread(target=run, args=(save_duplicate,))
+        saver.start()
+        assert adopted.wait(5)
+        # Last material referencing the blob is deleted before the duplicate commits
+        deleter = threading.Thread(target=run, args=(existing.delete,))
+        deleter.start()
+        deleter.join(0.5)
+        assert deleter.is_alive()
+        commit.set()
+        saver.join()
+        deleter.join()
+
+        assert not errors
+        duplicate = Material.objects.get()
+        assert duplicate.name == 'copy.pdf'
+        assert duplicate.file.read() == CONTENT
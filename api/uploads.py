@@ -0,0 +1,86 @@
+'''
+File operations of resumable material uploads (see MaterialUpload).
+Part files live in media storage, so finalizing is a rename instead of a copy.
+'''
+import contextlib
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.db import connection
+
+
+BLOCK_SIZE = 1024 * 1024
+
+
+def create_part_file(upload):
+    '''
+    Preallocates part file of the upload, chunks are written into it at their offsets.
+    '''
+    path = default_storage.path(upload.part_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.truncate(upload.size)
+
+
+def lock_part_file(upload, shared=False):
+    '''
+    Locks part file of the upload until the end of current transaction. Chunk writes share
+    the lock and run in parallel, finalizing takes it alone, so the file does not change
+    while it is hashed and moved.
+    '''
+    function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {function}(hashtext(%s))', [upload.part_name])
+
+
+def write_chunk(upload, offset, stream, length):
+    '''
+    Writes at most `length` bytes of stream at offset of the part file.
+    Returns number of bytes read from stream, more than `length` means the chunk is too long.
+    '''
+    fd = os.open(default_storage.path(upload.part_name), os.O_WRONLY)
+    try:
+        written = 0
+        while written <= length:
+            block = stream.read(min(BLOCK_SIZE, length + 1 - written))
+            if not block:
+                break
+            # pwrite does not move a shared file position, parallel chunks do not interfere
+            os.pwrite(fd, block[:length - written], offset + written)
+            written += len(block)
+        return written
+    finally:
+        os.close(fd)
+
+
+def get_sha256(upload):
+    digest = hashlib.sha256()
+    with open(default_storage.path(upload.part_name), 'rb') as file:
+        while block := file.read(BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def move_to_storage(upload, storage):
+    '''
+    Moves completed part file into content addressed storage and returns its name.
+    Checksum is already verified, so duplicates are dropped without reading the file again.
+    Storage adopts a hard link of the part file, the part file itself stays until the upload
+    is deleted after commit, so a rolled back finalize can be retried.
+    '''
+    link_path = default_storage.path(get_link_name(upload.part_name))
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(link_path)
+    os.link(default_storage.path(upload.part_name), link_path)
+    return storage.adopt(link_path, upload.sha256)
+
+
+def get_link_name(part_name):
+    # Left behind only by a finalize which failed before storage adopted it
+    return f'{part_name}.adopted'
+
+
+def delete_part_file(part_name):
+    default_storage.delete(part_name)
+    default_storage.delete(get_link_name(part_name))
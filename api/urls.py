@@ -1,7 +1,9 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedDefaultRouter
 
-from api.views import ProfileViewSet, PatientViewSet, MaterialViewSet
+from api import async_views
+from api.views import ProfileViewSet, PatientViewSet, MaterialViewSet, MaterialUploadViewSet
 
 
 router = DefaultRouter()
@@ -9,6 +11,15 @@ router.register('profiles', ProfileViewSet)
 router.register('patients', PatientViewSet)
 
 patient_router = NestedDefaultRouter(router, 'patients', lookup='patient')
+# Registered before materials, otherwise `uploads` would match material pk
+patient_router.register('materials/uploads', MaterialUploadViewSet, basename='material-upload')
 patient_router.register('materials', MaterialViewSet)
 
-urlpatterns = router.urls + patient_router.urls
\ No newline at end of file
+# Async read only variants for ASGI deployments
+async_urlpatterns = [
+    path('async/patients/', async_views.patient_list, name='async-patient-list'),
+    path('async/patients/<int:pk>/', async_views.patient_detail, name='async-patient-detail'),
+    path('async/patients/<int:patient_pk>/materials/', async_views.material_list, name='async-material-list'),
+]
+
+urlpatterns = router.urls + patient_router.urls + async_urlpatterns
\ No newline at end of file
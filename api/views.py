@@ -1,29 +1,55 @@
-from typing import Union, Any
+import mimetypes
+import os
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, Func, OuterRef, Q, Value
+from django.db.models.functions import Concat
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header, parse_http_date_safe
 from rest_framework.response import Response
-from rest_framework.request import Request
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework import status
+from rest_framework.parsers import JSONParser
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
-from rest_framework.mixins import ListModelMixin, UpdateModelMixin
+from rest_framework.mixins import CreateModelMixin, DestroyModelMixin, ListModelMixin, RetrieveModelMixin, UpdateModelMixin
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.permissions import SAFE_METHODS
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 
-from api.models import Material, Patient, Profile
+from api import cache as patient_list_cache
+from api.filters import FullTextSearchFilter
+from api.mixins import CompiledReadMixin, ConditionalGetMixin, ParentPatientMixin, SparseFieldsetMixin
+from api import archives, uploads
+from api.models import Material, MaterialUpload, Patient, Profile, Tombstone
+from api.pagination import PatientPagination
+from api.parsers import NDJSONParser
+from api.renderers import CSVRenderer, NDJSONRenderer
 from api.serializers import (
     CreatePatientSerializer,
     FullPatientSerializer,
     PatientSerializer,
     ProfileSerializer,
     MaterialSerializer,
+    MaterialUploadSerializer,
+    SyncWatermarkSerializer,
+    TombstoneSerializer,
 )
+from core.authentication import StatelessJWTAuthentication
+from core.schemas import LazySchemaMixin
 
 
-class ProfileViewSet(ListModelMixin, UpdateModelMixin, GenericViewSet):
+class ProfileViewSet(SparseFieldsetMixin, CompiledReadMixin, ListModelMixin, UpdateModelMixin, LazySchemaMixin, GenericViewSet):
     queryset = Profile.objects.select_related('user').all()
     serializer_class = ProfileSerializer
     permission_classes = [IsAdminUser]
+    authentication_classes = [StatelessJWTAuthentication]
 
     @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated], url_path='me', url_name='me')
     def get_profile(self, request):
@@ -38,22 +64,34 @@ class ProfileViewSet(ListModelMixin, UpdateModelMixin, GenericViewSet):
         return Response(serializer.data)
 
 
-class PatientViewSet(ModelViewSet):
-    queryset = Patient.objects.all()
+class PatientViewSet(ConditionalGetMixin, SparseFieldsetMixin, CompiledReadMixin, LazySchemaMixin, ModelViewSet):
+    queryset = Patient.objects.defer('search_vector')
     serializer_class = PatientSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = PatientPagination
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, OrderingFilter]
     filterset_fields = ['birth_date']
-    search_fields = ['first_name', 'last_name', 'med_condition']
-    ordering_fields = ['birth_date', 'created_at']
+    search_vector_field = 'search_vector'
+    autocomplete_limit = 10
+    export_fields = [
+        'id', 'first_name', 'last_name', 'birth_date', 'gender', 'med_condition',
+        'materials_count', 'last_material_at', 'created', 'updated',
+    ]
+    export_chunk_size = 2000
+    sync_page_size = 500
+    ordering_fields = ['birth_date', 'created_at', 'materials_count', 'last_material_at']
+    # Keyset pagination reads `updated` of the last patient
+    sparse_fieldset_required = ('updated',)
 
     def get_queryset(self):
         user = self.request.user
+        queryset = super().get_queryset()
         if not user.is_staff:
-            self.queryset = self.queryset.filter(doctor_id=user.profile.id)
+            queryset = queryset.filter(doctor_id=user.profile_id)
         elif user.is_staff:
-            self.queryset = self.queryset.select_related('doctor', 'doctor__user')
-        return super().get_queryset()
+            queryset = queryset.select_related('doctor', 'doctor__user')
+        return queryset
     
     def get_serializer_class(self):
         if self.request.user.is_staff:
@@ -63,50 +101,297 @@ class PatientViewSet(ModelViewSet):
                 self.serializer_class = CreatePatientSerializer
         return super().get_serializer_class()
 
+    def list(self, request, *args, **kwargs):
+        '''
+        Serves pages from per doctor cache (see api.cache), conditional GET works on cached pages too.
+        '''
+        scope = patient_list_cache.get_scope(request.user)
+        request_key = patient_list_cache.get_request_key(request, self.get_serializer_class())
+        cached, version = patient_list_cache.get(scope, request_key)
+        if cached is not None:
+            etag, timestamp, data = cached
+            return self.conditional_response(request, etag, timestamp, lambda: Response(data))
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            timestamp = parse_http_date_safe(response.get('Last-Modified'))
+            patient_list_cache.set(scope, request_key, (response['ETag'], timestamp, response.data), version)
+        return response
+
+    @action(detail=False, methods=['GET'], permission_classes=[IsAdminUser], url_path='cache-stats', url_name='cache-stats')
+    def cache_stats(self, request):
+        '''
+        Hit and miss counters of patient list cache for monitoring, counted by the worker answering.
+        '''
+        return Response(patient_list_cache.get_stats())
+
+    @action(detail=False, methods=['GET'], url_path='autocomplete', url_name='autocomplete')
+    def autocomplete(self, request):
+        '''
+        Typeahead for patient names. Every word of `q` must prefix either first or last name.
+        Returns at most `autocomplete_limit` of {id, full_name} without pagination.
+        '''
+        words = request.query_params.get('q', '').split()
+        if not words:
+            return Response([])
+
+        name_filter = Q()
+        for word in words:
+            name_filter &= Q(first_name__istartswith=word) | Q(last_name__istartswith=word)
+
+        # Served by name trigram indexes, ordering is dropped to stop at the limit without sorting all matches
+        patients = self.get_queryset().filter(name_filter).order_by().annotate(
+            full_name=Concat('first_name', Value(' '), 'last_name')
+        ).values('id', 'full_name')[:self.autocomplete_limit]
+        return Response(list(patients))
+
+    @action(detail=False, methods=['GET'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        '''
+        Streams all patients visible to the user as NDJSON or CSV, chosen with Accept header or `?format=`.
+        Rows are read with server side cursor as plain values, so memory stays flat regardless of row count.
+        Supports the same filters as list.
+        '''
+        fields = self.export_fields + ['doctor_id'] if request.user.is_staff else self.export_fields
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.query.order_by:
+            # Default ordering can not be served by (doctor_id, updated, id) index
+            queryset = queryset.order_by('updated', 'id')
+        rows = queryset.values(*fields).iterator(chunk_size=self.export_chunk_size)
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(rows, fields),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = f'attachment; filename="patients.{renderer.format}"'
+        return response
+
+    @action(detail=False, methods=['GET'])
+    def sync(self, request):
+        '''
+        Delta sync from watermark (`updated_since`, `after_id`).
+        Returns patients changed after the watermark in (updated, id) order and tombstones
+        of patients and materials deleted within the same time window.
+        Clients follow `next` watermark while `has_more`, rows may be delivered more than once.
+        Changes of the last SYNC_SAFETY_LAG seconds are left for the next sync, as transactions
+        still running may commit rows with `updated` older than now.
+        '''
+        watermark = SyncWatermarkSerializer(data=request.query_params)
+        watermark.is_valid(raise_exception=True)
+        since = watermark.validated_data.get('updated_since')
+        after_id = watermark.validated_data['after_id']
+        horizon = timezone.now() - timedelta(seconds=settings.SYNC_SAFETY_LAG)
+
+        patients = self.get_queryset().filter(updated__lte=horizon).order_by('updated', 'id')
+        if since is not None:
+            patients = patients.filter(Q(updated__gt=since) | Q(updated=since, id__gt=after_id))
+        patients = list(patients[:self.sync_page_size + 1])
+
+        has_more = len(patients) > self.sync_page_size
+        patients = patients[:self.sync_page_size]
+        until, until_id = (patients[-1].updated, patients[-1].id) if has_more else (horizon, 0)
+
+        # Full snapshot needs no tombstones
+        tombstones = Tombstone.objects.none()
+        if since is not None:
+            tombstones = Tombstone.objects.filter(deleted__gt=since, deleted__lte=until)
+            if not request.user.is_staff:
+                tombstones = tombstones.filter(doctor_id=request.user.profile_id)
+            else:
+                # Reassigned patients leave only their previous doctor's scope
+                tombstones = tombstones.exclude(
+                    Exists(Patient.objects.filter(id=OuterRef('object_id'))),
+                    model=Tombstone.ModelChoice.PATIENT,
+                )
+
+        return Response({
+            'results': self.get_serializer(patients, many=True).data,
+            'deleted': TombstoneSerializer(tombstones, many=True).data,
+            'has_more': has_more,
+            'next': SyncWatermarkSerializer({'updated_since': until, 'after_id': until_id}).data,
+        })
+
+    @action(detail=False, methods=['POST'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        '''
+        Creates and updates patients from JSON array or NDJSON rows in one transaction.
+        Rows with `id` replace the existing patient, other rows are created.
+        Nothing is written if any row is invalid, errors are listed per row.
+        '''
+        context = self.get_serializer_context()
+        context['queryset'] = self.get_queryset()
+        serializer = self.get_serializer(data=request.data, many=True, context=context)
+        serializer.is_valid(raise_exception=True)
+
+        if request.user.is_staff:
+            serializer.save()
+        else:
+            # Doctor is resolved once for the whole batch
+            serializer.save(doctor_id=request.user.profile_id)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 
-class MaterialViewSet(ModelViewSet):
+class MaterialViewSet(ConditionalGetMixin, ParentPatientMixin, LazySchemaMixin, ModelViewSet):
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
 
-    def get_queryset(self):
-        user = self.request.user
-        self.queryset = self.queryset.filter(patient_id=self.kwargs["patient_pk"])
-        if not user.is_staff:
-            self.queryset = self.queryset.filter(patient__doctor_id=user.profile.id)
-        return super().get_queryset()
-    
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['patient_id'] = self.kwargs.get('patient_pk')
         return context
 
     def list(self, request, *args, **kwargs):
-        patient_404 = self.has_parent_patient(request, kwargs['patient_pk'])
-        if patient_404:
-            return patient_404
-
+        self.get_parent_patient()
         return super().list(request, *args, **kwargs)
-    
-    def create(self, request, *args, **kwargs):
-        patient_404 = self.has_parent_patient(request, kwargs['patient_pk'])
-        if patient_404:
-            return patient_404
 
+    def create(self, request, *args, **kwargs):
+        self.get_parent_patient()
         return super().create(request, *args, **kwargs)
 
-    def has_parent_patient(self, request: Request, patient_pk: Any) -> Union[Response, None]:
+    def perform_create(self, serializer):
+        serializer.save(patient=self.get_parent_patient())
+
+    @action(detail=True, methods=['GET'], url_path='download', url_name='download')
+    def download(self, request, *args, **kwargs):
         '''
-        Returns 404 response object if parent patient object does not exist or 
-        parent patient object is not relative for non admin user
+        Authorized download of material file.
         '''
-        if request.user.is_staff:
-            patient = Patient.objects.filter(id=patient_pk)
+        material = self.get_object()
+        return self.send_file(material.file, material.name or os.path.basename(material.file.name), as_attachment=True)
+
+    @action(detail=True, methods=['GET'], url_path='thumbnail', url_name='thumbnail')
+    def thumbnail(self, request, *args, **kwargs):
+        '''
+        Authorized thumbnail of material file, see `preview_status` for its availability.
+        '''
+        material = self.get_object()
+        if not material.thumbnail:
+            raise NotFound('Thumbnail not found')
+        return self.send_file(material.thumbnail, os.path.basename(material.thumbnail.name), as_attachment=False)
+
+    @action(detail=False, methods=['GET'], url_path='archive', url_name='archive')
+    def archive(self, request, *args, **kwargs):
+        '''
+        ZIP archive of all material files of the patient, built while it is sent.
+        '''
+        patient = self.get_parent_patient()
+        # Rows are fetched ahead, so no cursor is held open while the archive is sent
+        materials = list(self.get_queryset().only('id', 'name', 'file', 'updated').order_by('created', 'id'))
+        names = archives.get_unique_names(
+            material.name or os.path.basename(material.file.name) for material in materials
+        )
+        response = StreamingHttpResponse(
+            archives.stream_zip(
+                (name, material.updated, material.file) for name, material in zip(names, materials)
+            ),
+            content_type='application/zip',
+        )
+        response['Content-Disposition'] = content_disposition_header(True, f'patient-{patient.id}-materials.zip')
+        response['Cache-Control'] = 'private, no-store'
+        # Let nginx pass the archive through instead of buffering it to disk
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def send_file(self, file, filename, as_attachment):
+        '''
+        Behind nginx (`MATERIAL_ACCEL_REDIRECT`) the file is sent by nginx from its internal media location,
+        otherwise it is streamed with FileResponse.
+        '''
+        if settings.MATERIAL_ACCEL_REDIRECT:
+            response = HttpResponse(content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+            response['X-Accel-Redirect'] = quote(f'/{settings.MEDIA_URL.strip("/")}/{file.name}')
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
         else:
-            patient = Patient.objects.filter(id=patient_pk, doctor=request.user.profile)
+            try:
+                file = file.open('rb')
+            except FileNotFoundError:
+                raise NotFound('File not found')
+            response = FileResponse(file, as_attachment=as_attachment, filename=filename)
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
+
+class MaterialUploadViewSet(
+    ParentPatientMixin,
+    CreateModelMixin,
+    RetrieveModelMixin,
+    DestroyModelMixin,
+    LazySchemaMixin,
+    GenericViewSet,
+):
+    '''
+    Resumable chunked upload of material files:
+    POST starts an upload, PUT `?offset=` writes one chunk (raw body, chunks may be sent in parallel
+    and in any order), GET shows received chunks for resuming, `finalize` verifies the checksum
+    and creates the material, DELETE aborts the upload.
+    '''
+    queryset = MaterialUpload.objects.all()
+    serializer_class = MaterialUploadSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
+
+    def create(self, request, *args, **kwargs):
+        self.get_parent_patient()
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(patient=self.get_parent_patient())
+
+    def update(self, request, *args, **kwargs):
+        upload = self.get_object()
+        try:
+            offset = int(request.query_params.get('offset', ''))
+        except ValueError:
+            offset = -1
+        if offset < 0 or offset >= upload.size or offset % upload.chunk_size:
+            raise ValidationError({'offset': [f'Offset must be a multiple of {upload.chunk_size} below {upload.size}.']})
+
+        index = offset // upload.chunk_size
+        length = upload.get_chunk_length(index)
+        with transaction.atomic():
+            uploads.lock_part_file(upload, shared=True)
+            if not MaterialUpload.objects.filter(pk=upload.pk).exists():
+                raise NotFound('Upload is already finalized')
+            # Body is read from the stream and written in place, it is never parsed nor buffered whole
+            if uploads.write_chunk(upload, offset, request.stream or BytesIO(), length) != length:
+                raise ValidationError({'detail': f'Chunk at offset {offset} must have {length} bytes.'})
 
-        if not patient.exists():
-            return Response(
-                {'detail': 'Patient not found'},
-                status=status.HTTP_404_NOT_FOUND
+            MaterialUpload.objects.filter(pk=upload.pk).update(
+                received_chunks=Func(F('received_chunks'), Value(index), function='array_append'),
             )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['POST'])
+    def finalize(self, request, *args, **kwargs):
+        upload = self.get_object()
+        with transaction.atomic():
+            # Waits for chunks being written, later chunks and concurrent finalize find the upload gone.
+            # Part file lock is taken before the row lock, in the same order as chunk writes.
+            uploads.lock_part_file(upload)
+            upload = MaterialUpload.objects.select_for_update().filter(pk=upload.pk).first()
+            if upload is None:
+                raise NotFound('Upload is already finalized')
+            missing_chunks = sorted(set(range(upload.chunks_count)) - set(upload.received_chunks))
+            if missing_chunks:
+                raise ValidationError({'received_chunks': [f'Missing chunks: {missing_chunks[:100]}.']})
+
+            checksum_matches = uploads.get_sha256(upload) == upload.sha256
+            if checksum_matches:
+                material = Material.objects.create(
+                    patient_id=upload.patient_id,
+                    file=uploads.move_to_storage(upload, Material._meta.get_field('file').storage),
+                    name=os.path.basename(upload.filename),
+                )
+                upload.delete()
+            else:
+                upload.received_chunks = []
+                upload.save(update_fields=['received_chunks'])
+
+        if not checksum_matches:
+            raise ValidationError({'sha256': ['Checksum mismatch, upload the file again.']})
+        serializer = MaterialSerializer(material, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,56 @@
+'''
+Compares bytes on the wire and CPU time per response of CompressionMiddleware encodings.
+"page" is a rendered staff list page of 50 patients, "export" the NDJSON export stream
+of 5000 patients compressed chunk by chunk. Requires Brotli and zstandard for br and zstd.
+
+    python -m benchmarks.bench_compression --rows 5000 --page-size 50
+'''
+import argparse
+
+from benchmarks.utils import benchmark_database, measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--doctors', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--keepdb', action='store_true', help='reuse benchmark database between runs')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from core.middleware import GzipCompressor, compress_stream, get_compressors
+    from api.models import Patient
+    from api.renderers import FastJSONRenderer, NDJSONRenderer
+    from api.serializers import FullPatientSerializer
+    from api.views import PatientViewSet
+    from benchmarks.fixtures import make_doctors, make_patients
+
+    with benchmark_database(keepdb=args.keepdb):
+        if Patient.objects.count() < args.rows:
+            print(f'Generating {args.rows} patients for {args.doctors} doctors...')
+            make_patients(args.rows, make_doctors(args.doctors))
+
+        queryset = Patient.objects.select_related('doctor', 'doctor__user').order_by('id')
+        page = FastJSONRenderer().render(
+            {'results': FullPatientSerializer(queryset[:args.page_size], many=True).data}
+        )
+        rows = list(queryset[:args.rows].values(*PatientViewSet.export_fields))
+        chunks = list(NDJSONRenderer().stream(rows, PatientViewSet.export_fields))
+
+        compressors = {'gzip': GzipCompressor, **get_compressors()}
+        for name, body in [('page', [page]), ('export', chunks)]:
+            size = sum(map(len, body))
+            report(f'{name}: identity ({size} B)', measure(lambda: b''.join(body), args.repeat))
+            for encoding, compressor_class in compressors.items():
+                size = len(b''.join(compress_stream(body, compressor_class())))
+                report(
+                    f'{name}: {encoding} ({size} B)',
+                    measure(lambda: b''.join(compress_stream(body, compressor_class())), args.repeat),
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+'''
+Compares requests/s of patient list under many concurrent connections served by
+gunicorn sync workers (DRF endpoint) and by uvicorn workers (async endpoint).
+Both servers run with the same number of workers against the benchmark database.
+Requires gunicorn and uvicorn.
+
+    python -m benchmarks.bench_concurrency --connections 500 --requests 10000 --workers 3
+'''
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.utils import benchmark_database, report, setup_django
+
+
+SERVERS = {
+    'sync (gunicorn, wsgi)': (['medical_rec.wsgi:application'], '/api/patients/'),
+    'async (uvicorn, asgi)': (
+        ['--worker-class', 'uvicorn.workers.UvicornWorker', 'medical_rec.asgi:application'],
+        '/api/async/patients/',
+    ),
+}
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not start on port {port}')
+
+
+async def fetch(port, path, token):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(
+        f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: JWT {token}\r\nConnection: close\r\n\r\n'.encode()
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response.split(b' ', 2)[1] == b'200'
+
+
+async def load(port, path, token, connections, requests):
+    '''
+    Returns (wall time, latencies, failed requests) of `requests` sent over `connections` concurrent connections.
+    '''
+    semaphore = asyncio.Semaphore(connections)
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = await fetch(port, path, token)
+            except OSError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            failures += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - start, latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=10_000)
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=10_000)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--keepdb', action='store_true', help='reuse benchmark database between runs')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+
+    from api.models import Patient
+    from benchmarks.fixtures import make_doctors, make_patients
+    from core.serializers import TokenObtainPairSerializer
+
+    with benchmark_database(keepdb=args.keepdb) as connection:
+        if not Patient.objects.exists():
+            print(f'Generating {args.patients} patients...')
+            make_patients(args.patients, make_doctors(1))
+        user = get_user_model().objects.filter(profile__isnull=False).first()
+        token = str(TokenObtainPairSerializer.get_token(user).access_token)
+
+        env = {
+            **os.environ,
+            'DB_NAME': connection.settings_dict['NAME'],
+            # Compare request handling, not the patient list cache
+            'PATIENT_LIST_CACHE_TIMEOUT': '0',
+            'DEBUG': 'False',
+        }
+        for label, (server_args, path) in SERVERS.items():
+            port = get_free_port()
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+                 '--backlog', str(args.connections * 2), '--log-level', 'warning', *server_args],
+                env=env,
+            )
+            try:
+                wait_for_port(port)
+                asyncio.run(load(port, path, token, args.workers, args.workers * 10))
+                elapsed, latencies, failures = asyncio.run(
+                    load(port, path, token, args.connections, args.requests)
+                )
+            finally:
+                server.terminate()
+                server.wait()
+            print(f'{label:<56} {args.requests / elapsed:10.1f} requests/s   failed {failures}')
+            report(f'{label} latency', latencies)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+'''
+Compares rendering of 5000 patient rows with DRF's JSONRenderer, FastJSONRenderer (orjson)
+and MessagePackRenderer. "page" renders serialized patients of a staff list page,
+"export" renders values() rows with native dates as the NDJSON export does.
+Requires orjson and msgpack.
+
+    python -m benchmarks.bench_renderers --rows 5000
+'''
+import argparse
+
+from benchmarks.utils import benchmark_database, measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--doctors', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--keepdb', action='store_true', help='reuse benchmark database between runs')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from rest_framework.renderers import JSONRenderer
+
+    from api import renderers
+    from api.models import Patient
+    from api.renderers import FastJSONRenderer, MessagePackRenderer, NDJSONRenderer
+    from api.serializers import FullPatientSerializer
+    from api.views import PatientViewSet
+    from benchmarks.fixtures import make_doctors, make_patients
+
+    with benchmark_database(keepdb=args.keepdb):
+        if Patient.objects.count() < args.rows:
+            print(f'Generating {args.rows} patients for {args.doctors} doctors...')
+            make_patients(args.rows, make_doctors(args.doctors))
+
+        queryset = Patient.objects.select_related('doctor', 'doctor__user').order_by('id')[:args.rows]
+        datasets = {
+            'page': {'results': FullPatientSerializer(queryset, many=True).data},
+            'export': list(queryset.values(*PatientViewSet.export_fields)),
+        }
+        for name, data in datasets.items():
+            for renderer in [JSONRenderer(), FastJSONRenderer(), MessagePackRenderer()]:
+                size = len(renderer.render(data))
+                report(
+                    f'{name}: {renderer.__class__.__name__} ({size // 1024} KiB)',
+                    measure(lambda: renderer.render(data), args.repeat),
+                )
+
+        rows = datasets['export']
+        fields = PatientViewSet.export_fields
+        report('export: NDJSONRenderer', measure(lambda: b''.join(NDJSONRenderer().stream(rows, fields)), args.repeat))
+        orjson, renderers.orjson = renderers.orjson, None
+        try:
+            report(
+                'export: NDJSONRenderer without orjson',
+                measure(lambda: b''.join(NDJSONRenderer().stream(rows, fields)), args.repeat),
+            )
+        finally:
+            renderers.orjson = orjson
+
+
+if __name__ == '__main__':
+    main()
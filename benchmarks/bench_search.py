@@ -0,0 +1,56 @@
+'''
+Compares patient search through DRF's SearchFilter (ILIKE over three columns)
+with FullTextSearchFilter (tsvector + GIN index) on a synthetic dataset.
+
+    python -m benchmarks.bench_search --patients 1000000 --doctors 200
+'''
+import argparse
+
+from benchmarks.utils import benchmark_database, measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=1_000_000)
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--keepdb', action='store_true', help='reuse benchmark database between runs')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from rest_framework.filters import SearchFilter
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from api.filters import FullTextSearchFilter
+    from api.models import Patient
+    from benchmarks.fixtures import make_doctors, make_patients
+
+    class View:
+        search_fields = ['first_name', 'last_name', 'med_condition']
+        search_vector_field = 'search_vector'
+
+    factory = APIRequestFactory()
+
+    with benchmark_database(keepdb=args.keepdb):
+        if not Patient.objects.exists():
+            print(f'Generating {args.patients} patients for {args.doctors} doctors...')
+            make_patients(args.patients, make_doctors(args.doctors))
+        doctor_id = Patient.objects.values_list('doctor_id', flat=True).first()
+
+        scopes = {
+            'all patients': Patient.objects.defer('search_vector'),
+            'one doctor': Patient.objects.defer('search_vector').filter(doctor_id=doctor_id),
+        }
+        for term in ['asthma', 'smith', 'chronic migraine']:
+            request = Request(factory.get('/', {'search': term}))
+            for scope, queryset in scopes.items():
+                for backend in [SearchFilter(), FullTextSearchFilter()]:
+                    def run():
+                        list(backend.filter_queryset(request, queryset, View())[:50])
+                    report(f'{backend.__class__.__name__} {scope} "{term}"', measure(run, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
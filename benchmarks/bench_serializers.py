@@ -0,0 +1,55 @@
+'''
+Compares cost per row of patient list serialization for staff: DRF FullPatientSerializer over model
+instances vs serializer compiled by api.compiled over values() rows, at several page sizes.
+"serialize" times rendering of rows fetched ahead, "fetch + serialize" includes the query.
+
+    python -m benchmarks.bench_serializers --patients 10000 --page-sizes 50 500 5000
+'''
+import argparse
+
+from benchmarks.utils import benchmark_database, measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=10_000)
+    parser.add_argument('--doctors', type=int, default=20)
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--keepdb', action='store_true', help='reuse benchmark database between runs')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from api.compiled import compile_serializer
+    from api.models import Patient
+    from api.serializers import FullPatientSerializer
+    from benchmarks.fixtures import make_doctors, make_patients
+
+    compiled = compile_serializer(FullPatientSerializer)
+    queryset = Patient.objects.defer('search_vector').select_related('doctor', 'doctor__user').order_by('updated', 'id')
+
+    with benchmark_database(keepdb=args.keepdb):
+        if not Patient.objects.exists():
+            print(f'Generating {args.patients} patients for {args.doctors} doctors...')
+            make_patients(args.patients, make_doctors(args.doctors))
+
+        for page_size in args.page_sizes:
+            instances = list(queryset[:page_size])
+            rows = list(compiled.values(queryset)[:page_size])
+            assert compiled.render(rows) == FullPatientSerializer(instances, many=True).data
+
+            runs = {
+                'DRF serializer: serialize': lambda: FullPatientSerializer(instances, many=True).data,
+                'compiled: serialize': lambda: compiled.render(rows),
+                'DRF serializer: fetch + serialize': lambda: FullPatientSerializer(
+                    list(queryset[:page_size]), many=True,
+                ).data,
+                'compiled: fetch + serialize': lambda: compiled.render(compiled.values(queryset)[:page_size]),
+            }
+            for label, run in runs.items():
+                report(f'{label} ({len(instances)} rows)', measure(run, args.repeat), per=len(instances))
+
+
+if __name__ == '__main__':
+    main()
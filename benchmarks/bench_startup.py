@@ -0,0 +1,73 @@
+'''
+Measures boot time of a web worker: importing the WSGI application and loading the URLconf
+(done on first request), each in a fresh interpreter. "production" uses the environment as is,
+"debug" enables DEBUG (and with it debug toolbar and admin). The slowest imports of production
+boot are listed from `python -X importtime`. Needs no database.
+
+    python -m benchmarks.bench_startup --repeat 10 --top 15
+'''
+import argparse
+import collections
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.utils import report
+
+
+BOOT_CODE = '''
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_rec.settings')
+from medical_rec.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+'''
+
+
+def boot(env, importtime=False):
+    '''
+    Boots worker in a new interpreter, returns its wall time in seconds and stderr.
+    '''
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', BOOT_CODE]
+    start = time.perf_counter()
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stderr
+
+
+def get_package_times(importtime_output):
+    '''
+    Returns {top level package: self import time in microseconds} of `-X importtime` output.
+    '''
+    times = collections.Counter()
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, _, module = line[len('import time:'):].split('|')
+        times[module.strip().split('.')[0]] += int(self_time)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15, help='number of slowest packages to list')
+    args = parser.parse_args()
+
+    variants = {
+        'production': dict(os.environ),
+        'debug': {**os.environ, 'DEBUG': 'True'},
+    }
+    for name, env in variants.items():
+        boot(env)
+        report(f'boot: {name}', [boot(env)[0] for _ in range(args.repeat)])
+
+    _, output = boot(variants['production'], importtime=True)
+    times = get_package_times(output)
+    print(f'\nimports of production boot: {len(output.splitlines()) - 1} modules, {sum(times.values()) / 1000:.1f} ms')
+    for package, self_time in times.most_common(args.top):
+        print(f'{package:<56} {self_time / 1000:10.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
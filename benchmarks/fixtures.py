@@ -0,0 +1,80 @@
+'''
+Synthetic data generators for benchmarks. Rows are generated inside PostgreSQL
+with generate_series, so millions of patients load in seconds rather than hours.
+'''
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from api.models import Patient, Profile
+
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+]
+CONDITION_WORDS = [
+    'chronic', 'acute', 'asthma', 'hypertension', 'diabetes', 'fracture', 'migraine', 'allergy', 'infection',
+    'arrhythmia', 'anemia', 'arthritis', 'bronchitis', 'dermatitis', 'gastritis', 'insomnia', 'obesity',
+    'pneumonia', 'sinusitis', 'tonsillitis', 'patient', 'reports', 'pain', 'since', 'childhood', 'treated',
+    'with', 'medication', 'daily', 'monitoring', 'recommended', 'follow', 'up', 'in', 'two', 'weeks',
+]
+
+
+def make_doctors(count):
+    '''
+    Returns list of profile ids for `count` new doctors.
+    '''
+    User = get_user_model()
+    users = User.objects.bulk_create(
+        User(username=f'bench-doctor-{index}', first_name=FIRST_NAMES[index % len(FIRST_NAMES)], last_name='Doctor')
+        for index in range(count)
+    )
+    # bulk_create does not send post_save, so profiles are created here
+    profiles = Profile.objects.bulk_create(Profile(user=user, company_name='Benchmark Clinic') for user in users)
+    return [profile.id for profile in profiles]
+
+
+def make_patients(count, doctor_ids, condition_words=30):
+    '''
+    Inserts `count` patients spread evenly over `doctor_ids`.
+    '''
+    table = Patient._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {table} (
+                first_name, last_name, birth_date, gender, med_condition, doctor_id, created, updated, materials_count
+            )
+            SELECT
+                (%(first_names)s::text[])[1 + i %% %(first_names_len)s],
+                (%(last_names)s::text[])[1 + (i / %(first_names_len)s) %% %(last_names_len)s],
+                DATE '1940-01-01' + (i %% 30000),
+                CASE WHEN i %% 2 = 0 THEN 'M' ELSE 'F' END,
+                array_to_string(ARRAY(
+                    SELECT (%(words)s::text[])[1 + floor(random() * %(words_len)s)::int]
+                    FROM generate_series(1, %(condition_words)s) WHERE i > 0
+                ), ' '),
+                (%(doctor_ids)s::bigint[])[1 + i %% %(doctors_len)s],
+                now() - (i || ' seconds')::interval,
+                now() - (i || ' seconds')::interval,
+                0
+            FROM generate_series(1, %(count)s) AS s(i)
+            ''',
+            {
+                'first_names': FIRST_NAMES,
+                'first_names_len': len(FIRST_NAMES),
+                'last_names': LAST_NAMES,
+                'last_names_len': len(LAST_NAMES),
+                'words': CONDITION_WORDS,
+                'words_len': len(CONDITION_WORDS),
+                'condition_words': condition_words,
+                'doctor_ids': doctor_ids,
+                'doctors_len': len(doctor_ids),
+                'count': count,
+            },
+        )
+        cursor.execute(f'ANALYZE {table}')
@@ -0,0 +1,58 @@
+'''
+Helpers shared by benchmark scripts.
+Benchmarks run against a throwaway test database created from the configured one,
+so they never touch real patient data. Run them from the project root, e.g.:
+
+    python -m benchmarks.bench_search --patients 1000000
+'''
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_rec.settings')
+    django.setup()
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    '''
+    Creates (or reuses with keepdb) migrated test database and destroys it on exit.
+    '''
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def measure(func, repeat=20, warmup=2):
+    '''
+    Returns list of wall times in seconds for `repeat` calls of func.
+    '''
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label, timings, per=1):
+    '''
+    Prints median and p95 in milliseconds, divided by `per` (e.g. rows) when given.
+    '''
+    timings = sorted(timing / per for timing in timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    unit = 'ms' if per == 1 else 'ms/row'
+    print(f'{label:<56} median {statistics.median(timings) * 1000:10.4f} {unit}   p95 {p95 * 1000:10.4f} {unit}')
@@ -0,0 +1,166 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+
+class UserCache:
+    '''
+    In-process LRU of authenticated users keyed by user id, an entry serves only tokens with the same `iat`.
+    Every worker process has its own copy and invalidation reaches only the current process,
+    so keep `AUTH_USER_CACHE_TIMEOUT` short. Timeout 0 disables the cache.
+    '''
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        return settings.AUTH_USER_CACHE_TIMEOUT
+
+    def get(self, user_id, issued_at):
+        if not self.timeout:
+            return None
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            cached_issued_at, expires, user = entry
+            if cached_issued_at != issued_at or expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+        # Copy keeps changes made during one request out of the cache
+        return copy.copy(user)
+
+    def set(self, user_id, issued_at, user):
+        if not self.timeout:
+            return
+        with self.lock:
+            self.entries[user_id] = (issued_at, time.monotonic() + self.timeout, user)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > settings.AUTH_USER_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+class TokenVersions:
+    '''
+    Current token versions of users, tokens issued with another version are revoked.
+    Versions live in the default cache (shared by workers with file based cache),
+    a missing version is read from user table once.
+    '''
+    key_prefix = 'token-version'
+
+    def get_key(self, user_id):
+        return f'{self.key_prefix}:{user_id}'
+
+    def get(self, user_id):
+        key = self.get_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            version = get_user_model().objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+            if version is not None:
+                cache.set(key, version, None)
+        return version
+
+    def forget(self, user_id):
+        key = self.get_key(user_id)
+        # Forgotten again on commit in case a concurrent request cached the old version meanwhile
+        cache.delete(key)
+        transaction.on_commit(lambda: cache.delete(key))
+
+
+token_versions = TokenVersions()
+
+
+class ProfileTokenUser(TokenUser):
+    '''
+    Stateless user backed by token claims, profile is fetched only when accessed.
+    '''
+
+    @cached_property
+    def profile_id(self):
+        return self.token['profile_id']
+
+    @cached_property
+    def profile(self):
+        profile_model = get_user_model()._meta.get_field('profile').related_model
+        return profile_model.objects.select_related('user').get(id=self.profile_id)
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    '''
+    JWT authentication that loads user together with its profile in one query,
+    views use `request.user.profile` without another round trip.
+    '''
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        issued_at = validated_token.get('iat')
+        user = user_cache.get(user_id, issued_at)
+        if user is None:
+            try:
+                user = self.user_model.objects.select_related('profile').get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            user_cache.set(user_id, issued_at, user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if validated_token.get('token_version', user.token_version) != user.token_version:
+            raise AuthenticationFailed(_('Token is revoked'), code='token_revoked')
+
+        return user
+
+
+class StatelessJWTAuthentication(ProfileJWTAuthentication):
+    '''
+    With `JWT_STATELESS` enabled trusts claims of verified tokens and does not query user table,
+    tokens are only checked against current token version of the user.
+    Falls back to ProfileJWTAuthentication when disabled or for tokens issued without the claims.
+    Suits endpoints that need only id, profile id and staff flag of the user.
+    '''
+    claims = ('profile_id', 'is_staff', 'token_version')
+
+    def get_user(self, validated_token):
+        if not settings.JWT_STATELESS or any(claim not in validated_token for claim in self.claims):
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if token_versions.get(user_id) != validated_token['token_version']:
+            raise AuthenticationFailed(_('Token is revoked'), code='token_revoked')
+
+        return ProfileTokenUser(validated_token)
@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+from core.schemas import SCHEMA_FILES
+
+
+RENDERERS = {'yaml': OpenApiYamlRenderer, 'json': OpenApiJsonRenderer}
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates OpenAPI schema once and writes it as YAML and JSON files served at /doc/yml. '
+        'Run on every deploy, the schema changes with the code.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=settings.SCHEMA_ROOT, help='directory of schema files')
+
+    def handle(self, *args, **options):
+        schema = spectacular_settings.DEFAULT_GENERATOR_CLASS().get_schema(request=None, public=True)
+
+        os.makedirs(options['output_dir'], exist_ok=True)
+        for schema_format, (filename, _) in SCHEMA_FILES.items():
+            content = RENDERERS[schema_format]().render(schema, renderer_context={})
+            path = os.path.join(options['output_dir'], filename)
+            # Replaced atomically, workers never serve a partially written file
+            with tempfile.NamedTemporaryFile(dir=options['output_dir'], delete=False) as file:
+                file.write(content)
+            os.chmod(file.name, 0o644)
+            os.replace(file.name, path)
+            self.stdout.write(f'{path}: {len(content)} bytes')
+
+        self.stdout.write(self.style.SUCCESS('Done'))
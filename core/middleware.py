@@ -0,0 +1,190 @@
+'''
+Response compression negotiated from Accept-Encoding. zstd and brotli are used when zstandard
+and Brotli are installed, gzip is always available. Regular responses are compressed when their
+body reaches COMPRESSION_MIN_SIZE, streaming responses (exports, downloads) are compressed chunk
+by chunk as they are sent, so their body is never held in memory.
+'''
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Text-like types worth compressing, binary formats like images, PDF or ZIP are already compressed
+COMPRESSIBLE_CONTENT_TYPE_RE = re.compile(
+    r'^(text/|application/(json|javascript|xml|x-ndjson|msgpack|vnd\.oai\.openapi)|image/svg\+xml)'
+)
+
+
+class GzipCompressor:
+    encoding = 'gzip'
+    level = 6
+
+    def __init__(self):
+        # wbits 31 writes gzip header and trailer
+        self.compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor:
+    encoding = 'br'
+    # Qualities above 5 cost much more CPU for little gain on dynamic responses
+    quality = 5
+
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=self.quality)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdCompressor:
+    encoding = 'zstd'
+    level = 3
+
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+def get_compressors():
+    '''
+    Returns {encoding: compressor class} of COMPRESSION_ENCODINGS which are installed, in preference order.
+    '''
+    available = {'gzip': GzipCompressor}
+    if brotli is not None:
+        available['br'] = BrotliCompressor
+    if zstandard is not None:
+        available['zstd'] = ZstdCompressor
+    return {encoding: available[encoding] for encoding in settings.COMPRESSION_ENCODINGS if encoding in available}
+
+
+def parse_accept_encoding(header):
+    '''
+    Returns {coding: q value} of Accept-Encoding header.
+    '''
+    codings = {}
+    for item in header.split(','):
+        coding, *params = item.strip().split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            codings[coding.strip().lower()] = quality
+    return codings
+
+
+def negotiate_encoding(header, compressors):
+    '''
+    Returns compressor class of the encoding with highest q value accepted by the client,
+    ties are broken by server preference. Returns None if only identity is acceptable.
+    '''
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for encoding, compressor in compressors.items():
+        quality = codings.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = compressor, quality
+    return best
+
+
+def compress_stream(chunks, compressor):
+    for chunk in chunks:
+        # Compressor buffers small chunks, output is yielded as its blocks fill up
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def compress_async_stream(chunks, compressor):
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    '''
+    Compresses responses with zstd, br or gzip, whichever the client prefers (see COMPRESSION_ENCODINGS).
+    Must be placed above middlewares which modify response content.
+    '''
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.compressors = get_compressors()
+
+    def process_response(self, request, response):
+        if not self.is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressor_class = negotiate_encoding(request.headers.get('Accept-Encoding', ''), self.compressors)
+        if compressor_class is None:
+            return response
+
+        if response.streaming:
+            # Body is compressed while it is sent, length is unknown ahead
+            if response.is_async:
+                response.streaming_content = compress_async_stream(response.streaming_content, compressor_class())
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, compressor_class())
+            del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                return response
+            compressor = compressor_class()
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # Compressed body differs byte by byte, ETag of the representation becomes weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = compressor_class.encoding
+        return response
+
+    def is_compressible(self, response):
+        if response.has_header('Content-Encoding') or response.has_header('X-Accel-Redirect'):
+            return False
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        if response.status_code in (204, 304) or not response.streaming and not response.content:
+            return False
+        content_type = response.get('Content-Type', '').lower()
+        return bool(COMPRESSIBLE_CONTENT_TYPE_RE.match(content_type))
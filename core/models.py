@@ -1,9 +1,50 @@
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import AbstractUser
+from django.db import models
 
 
 # Overriding default User model to avoid future migration conflicts: https://docs.djangoproject.com/en/4.2/ref/settings/#std-setting-AUTH_USER_MODEL
 class User(AbstractUser):
-    pass
+    # Tokens carry the version they were issued with, bumping it revokes all of them
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta(AbstractUser.Meta):
-        ordering = ['-date_joined']
\ No newline at end of file
+        ordering = ['-date_joined']
+
+    @property
+    def profile_id(self) -> int:
+        return self.profile.id
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered to revoke tokens when claims they carry change
+        instance._loaded_token_claims = instance.get_token_claims()
+        return instance
+
+    def get_token_claims(self):
+        return (self.__dict__.get('is_active'), self.__dict__.get('is_staff'))
+
+    def set_password(self, raw_password):
+        super().set_password(raw_password)
+        if self.pk is not None:
+            self.token_version += 1
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            # Rehash of the same password after hasher changes is no password change, tokens stay valid
+            AbstractUser.set_password(self, raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+
+        return check_password(raw_password, self.password, setter)
+
+    def save(self, *args, **kwargs):
+        token_claims = self.get_token_claims()
+        if getattr(self, '_loaded_token_claims', token_claims) != token_claims:
+            self.token_version += 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'token_version' not in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'token_version'}
+        super().save(*args, **kwargs)
+        self._loaded_token_claims = token_claims
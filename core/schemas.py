@@ -0,0 +1,43 @@
+import functools
+import hashlib
+
+from django.utils.http import quote_etag
+from rest_framework.viewsets import _check_attr_name, _is_extra_action
+
+
+# Schema files precomputed by `manage.py generate_schema`: {format: (file name, content type)}
+SCHEMA_FILES = {
+    'yaml': ('schema.yml', 'application/vnd.oai.openapi'),
+    'json': ('schema.json', 'application/vnd.oai.openapi+json'),
+}
+
+
+# Collects @action methods of a viewset from class dicts instead of `inspect.getmembers`,
+# which reads `schema` and so imports DEFAULT_SCHEMA_CLASS while routers are built at startup.
+# A comment rather than a docstring, drf_spectacular would describe the operations of viewsets with it
+class LazySchemaMixin:
+    @classmethod
+    def get_extra_actions(cls):
+        members = {}
+        for klass in reversed(cls.__mro__):
+            members.update(vars(klass))
+        return [_check_attr_name(method, name) for name, method in sorted(members.items()) if _is_extra_action(method)]
+
+
+def get_schema_format(request):
+    '''
+    Returns schema format of `?format=` or Accept header, YAML by default as of SpectacularAPIView.
+    '''
+    schema_format = request.GET.get('format')
+    if schema_format in SCHEMA_FILES:
+        return schema_format
+    return 'json' if 'json' in request.headers.get('Accept', '') else 'yaml'
+
+
+@functools.lru_cache(maxsize=8)
+def get_file_etag(path, mtime_ns, size):
+    '''
+    Returns ETag of file content, cached until the file is replaced (its mtime or size change).
+    '''
+    with open(path, 'rb') as file:
+        return quote_etag(hashlib.md5(file.read(), usedforsecurity=False).hexdigest())
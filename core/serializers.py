@@ -1,4 +1,5 @@
 from djoser.serializers import UserSerializer as BaseUserSerializer, UserCreateSerializer as BaseUserCreateSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
 
 
 class UserCreateSerializer(BaseUserCreateSerializer):
@@ -9,4 +10,17 @@ class UserCreateSerializer(BaseUserCreateSerializer):
 
 class UserSerializer(BaseUserSerializer):
     class Meta(BaseUserSerializer.Meta):
-        fields = ['id', 'username', 'email', 'first_name', 'last_name']
\ No newline at end of file
+        fields = ['id', 'username', 'email', 'first_name', 'last_name']
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    '''
+    Adds claims trusted by core.authentication.StatelessJWTAuthentication.
+    '''
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['profile_id'] = user.profile_id
+        token['is_staff'] = user.is_staff
+        token['token_version'] = user.token_version
+        return token
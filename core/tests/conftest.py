@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from rest_framework.test import APIClient
 import pytest
 
@@ -11,4 +12,8 @@ def new_user_data():
     return {
         "username": "testusername",
         "password": "testpassword123"
-    }
\ No newline at end of file
+    }
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
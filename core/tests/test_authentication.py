@@ -0,0 +1,161 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+import pytest
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.authentication import user_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+@pytest.fixture
+def new_user(new_user_data):
+    # can not use baker when password must be hashed
+    return get_user_model().objects.create_user(**new_user_data)
+
+@pytest.fixture
+def jwt_client(client, new_user, new_user_data):
+    access_token = client.post(reverse('jwt-create'), data=new_user_data).data['access']
+    client.credentials(HTTP_AUTHORIZATION=f'JWT {access_token}')
+    return client
+
+
+@pytest.mark.django_db
+class TestProfileJWTAuthentication:
+    url = reverse('profile-me')
+
+    def test_user_and_profile_in_one_query(self, jwt_client, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            response = jwt_client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_inactive_user_returns_401(self, jwt_client, new_user):
+        new_user.is_active = False
+        new_user.save()
+
+        response = jwt_client.get(self.url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_cached_user_without_queries(self, settings, jwt_client, django_assert_num_queries):
+        settings.AUTH_USER_CACHE_TIMEOUT = 60
+        jwt_client.get(self.url)
+
+        with django_assert_num_queries(0):
+            response = jwt_client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_cache_invalidated_on_profile_change(self, settings, jwt_client, new_user):
+        settings.AUTH_USER_CACHE_TIMEOUT = 60
+        jwt_client.get(self.url)
+
+        new_user.profile.company_name = 'New Company'
+        new_user.profile.save()
+        response = jwt_client.get(self.url)
+
+        assert response.data['company_name'] == 'New Company'
+
+    def test_cache_invalidated_on_user_deactivation(self, settings, jwt_client, new_user):
+        settings.AUTH_USER_CACHE_TIMEOUT = 60
+        jwt_client.get(self.url)
+
+        new_user.is_active = False
+        new_user.save()
+        response = jwt_client.get(self.url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_revoked_token_returns_401(self, jwt_client, new_user):
+        new_user.set_password('new_password_951753')
+        new_user.save()
+
+        response = jwt_client.get(self.url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_password_rehash_on_login_keeps_tokens(self, settings, client, jwt_client, new_user, new_user_data):
+        settings.PASSWORD_HASHERS = [
+            'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+            'django.contrib.auth.hashers.MD5PasswordHasher',
+        ]
+        outdated_hash = make_password(new_user_data['password'], hasher='md5')
+        get_user_model().objects.filter(pk=new_user.pk).update(password=outdated_hash)
+
+        response = client.post(reverse('jwt-create'), data=new_user_data)
+
+        assert response.status_code == status.HTTP_200_OK
+        new_user.refresh_from_db()
+        assert new_user.password.startswith('pbkdf2_sha256$')
+        assert jwt_client.get(self.url).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+class TestStatelessJWTAuthentication:
+    url = reverse('patient-list')
+
+    @pytest.fixture(autouse=True)
+    def stateless(self, settings):
+        settings.JWT_STATELESS = True
+
+    def test_token_claims(self, client, new_user, new_user_data):
+        access_token = AccessToken(client.post(reverse('jwt-create'), data=new_user_data).data['access'])
+
+        assert access_token['profile_id'] == new_user.profile.id
+        assert access_token['is_staff'] is False
+        assert access_token['token_version'] == new_user.token_version
+
+    def test_user_table_not_queried(self, jwt_client):
+        jwt_client.get(self.url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = jwt_client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not any('"core_user"' in query['sql'] for query in queries)
+
+    def test_profile_fetched_on_access(self, jwt_client, new_user, django_assert_num_queries):
+        jwt_client.get(self.url)
+
+        with django_assert_num_queries(1):
+            response = jwt_client.get(reverse('profile-me'))
+
+        assert response.data['id'] == new_user.profile.id
+
+    def test_revoked_on_password_change(self, jwt_client, new_user):
+        jwt_client.get(self.url)
+
+        new_user.set_password('new_password_951753')
+        new_user.save()
+        response = jwt_client.get(self.url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_revoked_on_deactivation(self, jwt_client, new_user):
+        jwt_client.get(self.url)
+
+        new_user.is_active = False
+        new_user.save()
+        response = jwt_client.get(self.url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_new_token_after_revocation(self, client, jwt_client, new_user, new_user_data):
+        new_user.is_staff = True
+        new_user.save()
+        access_token = client.post(reverse('jwt-create'), data=new_user_data).data['access']
+        client.credentials(HTTP_AUTHORIZATION=f'JWT {access_token}')
+
+        response = client.get(reverse('profile-list'))
+
+        assert response.status_code == status.HTTP_200_OK
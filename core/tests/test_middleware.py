@@ -0,0 +1,117 @@
+import gzip
+import io
+import json
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+import pytest
+
+from core import middleware
+from core.middleware import CompressionMiddleware, negotiate_encoding
+
+
+BODY = json.dumps([{'med_condition': 'chronic asthma treated with daily medication'}] * 100).encode()
+
+
+def decompress(encoding, data):
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'br':
+        return middleware.brotli.decompress(data)
+    return middleware.zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def process(response, accept_encoding='gzip, deflate, br, zstd'):
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+    return CompressionMiddleware(lambda request: response).process_response(request, response)
+
+
+class TestNegotiateEncoding:
+    compressors = {'zstd': 'zstd', 'br': 'br', 'gzip': 'gzip'}
+
+    @pytest.mark.parametrize('header,expected', [
+        ('gzip, deflate, br, zstd', 'zstd'),
+        ('gzip, br', 'br'),
+        ('gzip;q=1.0, br;q=0.5', 'gzip'),
+        ('br;q=0, gzip', 'gzip'),
+        ('*', 'zstd'),
+        ('*;q=0.1, gzip;q=0.2', 'gzip'),
+        ('identity', None),
+        ('', None),
+    ])
+    def test_negotiation(self, header, expected):
+        assert negotiate_encoding(header, self.compressors) == expected
+
+
+class TestCompressionMiddleware:
+
+    @pytest.mark.parametrize('encoding', ['gzip', 'br', 'zstd'])
+    def test_compresses_json(self, settings, encoding):
+        settings.COMPRESSION_ENCODINGS = [encoding]
+        if encoding != 'gzip':
+            pytest.importorskip({'br': 'brotli', 'zstd': 'zstandard'}[encoding])
+
+        response = process(HttpResponse(BODY, content_type='application/json'))
+
+        assert response['Content-Encoding'] == encoding
+        assert response['Vary'] == 'Accept-Encoding'
+        assert int(response['Content-Length']) == len(response.content) < len(BODY)
+        assert decompress(encoding, response.content) == BODY
+
+    def test_small_body_not_compressed(self):
+        response = process(HttpResponse(b'{"id": 1}', content_type='application/json'))
+
+        assert not response.has_header('Content-Encoding')
+        assert response['Vary'] == 'Accept-Encoding'
+
+    def test_binary_content_not_compressed(self):
+        response = process(HttpResponse(BODY, content_type='application/pdf'))
+
+        assert not response.has_header('Content-Encoding')
+        assert not response.has_header('Vary')
+
+    def test_identity_only(self):
+        response = process(HttpResponse(BODY, content_type='application/json'), accept_encoding='identity')
+
+        assert not response.has_header('Content-Encoding')
+        assert response.content == BODY
+
+    def test_accel_redirect_not_compressed(self):
+        response = HttpResponse(BODY, content_type='text/plain')
+        response['X-Accel-Redirect'] = '/media/notes.txt'
+
+        assert not process(response).has_header('Content-Encoding')
+
+    def test_etag_becomes_weak(self, settings):
+        settings.COMPRESSION_ENCODINGS = ['gzip']
+        response = HttpResponse(BODY, content_type='application/json')
+        response['ETag'] = '"abc"'
+
+        assert process(response)['ETag'] == 'W/"abc"'
+
+    def test_streaming_compressed_lazily(self, settings):
+        settings.COMPRESSION_ENCODINGS = ['gzip']
+        consumed = []
+
+        def chunks():
+            for index in range(100):
+                consumed.append(index)
+                yield BODY
+
+        response = process(StreamingHttpResponse(chunks(), content_type='application/x-ndjson'))
+        stream = iter(response.streaming_content)
+        first = next(stream)
+
+        assert response['Content-Encoding'] == 'gzip'
+        assert len(consumed) < 100
+        assert gzip.GzipFile(fileobj=io.BytesIO(first + b''.join(stream))).read() == BODY * 100
+
+    def test_streaming_file_response(self, settings, tmp_path):
+        settings.COMPRESSION_ENCODINGS = ['gzip']
+        path = tmp_path / 'notes.txt'
+        path.write_bytes(BODY)
+
+        response = process(FileResponse(open(path, 'rb'), content_type='text/plain'))
+
+        assert not response.has_header('Content-Length')
+        assert gzip.decompress(b''.join(response.streaming_content)) == BODY
@@ -0,0 +1,104 @@
+import io
+import json
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+import pytest
+from rest_framework.viewsets import ViewSetMixin
+
+from api.views import MaterialUploadViewSet, MaterialViewSet, PatientViewSet, ProfileViewSet
+from core.views import UserViewSet
+
+
+@pytest.fixture(scope='session')
+def schema_root(tmp_path_factory):
+    path = tmp_path_factory.mktemp('schema')
+    call_command('generate_schema', output_dir=str(path), stdout=io.StringIO())
+    return path
+
+
+@pytest.fixture
+def schema_settings(settings, schema_root):
+    settings.SCHEMA_ROOT = schema_root
+    return settings
+
+
+class TestGenerateSchema:
+
+    def test_writes_yaml_and_json(self, schema_root):
+        assert b'/api/patients/' in (schema_root / 'schema.yml').read_bytes()
+        assert '/api/patients/' in json.loads((schema_root / 'schema.json').read_bytes())['paths']
+
+
+class TestSchemaView:
+    url = reverse('schema')
+
+    def test_serves_precomputed_yaml(self, client, schema_settings, schema_root):
+        response = client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/vnd.oai.openapi; charset=utf-8'
+        assert b''.join(response.streaming_content) == (schema_root / 'schema.yml').read_bytes()
+        assert response['ETag']
+        assert 'no-cache' in response['Cache-Control']
+
+    @pytest.mark.parametrize('params,headers', [
+        ({'format': 'json'}, {}),
+        ({}, {'HTTP_ACCEPT': 'application/vnd.oai.openapi+json'}),
+    ])
+    def test_serves_precomputed_json(self, client, schema_settings, params, headers):
+        response = client.get(self.url, params, **headers)
+
+        assert response['Content-Type'] == 'application/vnd.oai.openapi+json; charset=utf-8'
+        assert json.loads(b''.join(response.streaming_content))['openapi']
+
+    def test_not_modified(self, client, schema_settings):
+        etag = client.get(self.url)['ETag']
+
+        response = client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+
+    def test_etag_changes_with_file(self, client, schema_settings, tmp_path):
+        etag = client.get(self.url)['ETag']
+        schema_settings.SCHEMA_ROOT = tmp_path
+        (tmp_path / 'schema.yml').write_text('openapi: 3.0.3\n')
+
+        assert client.get(self.url, HTTP_IF_NONE_MATCH=etag)['ETag'] != etag
+
+    def test_not_generated(self, client, settings, tmp_path):
+        settings.SCHEMA_ROOT = tmp_path
+
+        assert client.get(self.url).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_post_not_allowed(self, client, schema_settings):
+        assert client.post(self.url).status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+    @pytest.mark.django_db
+    def test_generated_live_in_debug(self, client, settings, tmp_path):
+        settings.DEBUG = True
+        settings.SCHEMA_ROOT = tmp_path
+
+        response = client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert b'/api/patients/' in response.content
+
+
+class TestDocumentationPages:
+
+    @pytest.mark.parametrize('url_name', ['swagger-ui', 'redoc'])
+    def test_pages_point_to_schema(self, client, url_name):
+        response = client.get(reverse(url_name))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert reverse('schema') in response.content.decode()
+
+
+class TestLazySchemaMixin:
+
+    @pytest.mark.parametrize('viewset', [ProfileViewSet, PatientViewSet, MaterialViewSet, MaterialUploadViewSet, UserViewSet])
+    def test_extra_actions_match_viewset_mixin(self, viewset):
+        assert viewset.get_extra_actions() == ViewSetMixin.get_extra_actions.__func__(viewset)
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+from benchmarks.bench_startup import BOOT_CODE
+
+
+def get_boot_modules(**env):
+    '''
+    Returns modules imported by booting a worker with environment overrides.
+    '''
+    code = BOOT_CODE + 'import sys\nprint("\\n".join(sys.modules))'
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        env={**os.environ, **env},
+        cwd=settings.BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(result.stdout.split())
+
+
+class TestStartup:
+
+    def test_production_boot_skips_debug_and_schema_modules(self):
+        modules = get_boot_modules(DEBUG='False')
+
+        assert 'debug_toolbar' not in modules
+        assert 'drf_spectacular.openapi' not in modules
+        assert 'drf_spectacular.views' not in modules
+
+    def test_debug_toolbar_enabled_with_debug(self):
+        assert 'debug_toolbar.middleware' in get_boot_modules(DEBUG='True')
+
+    def test_debug_toolbar_disabled_in_debug(self):
+        assert 'debug_toolbar' not in get_boot_modules(DEBUG='True', DEBUG_TOOLBAR='False')
+
@@ -0,0 +1,19 @@
+from django.urls import re_path
+from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt import views as jwt_views
+
+from core.views import UserViewSet
+
+
+# Replaces djoser.urls and djoser.urls.jwt, importing either of them builds djoser's router
+# for its own UserViewSet, which reads `schema` of the viewset
+router = DefaultRouter()
+router.register('users', UserViewSet)
+
+jwt_urlpatterns = [
+    re_path(r'^jwt/create/?', jwt_views.TokenObtainPairView.as_view(), name='jwt-create'),
+    re_path(r'^jwt/refresh/?', jwt_views.TokenRefreshView.as_view(), name='jwt-refresh'),
+    re_path(r'^jwt/verify/?', jwt_views.TokenVerifyView.as_view(), name='jwt-verify'),
+]
+
+urlpatterns = router.urls + jwt_urlpatterns
@@ -1,3 +1,65 @@
-from django.shortcuts import render
+import os
 
-# Create your views here.
+from django.conf import settings
+from django.http import FileResponse, Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
+from djoser.views import UserViewSet as BaseUserViewSet
+
+from core.schemas import SCHEMA_FILES, LazySchemaMixin, get_file_etag, get_schema_format
+
+
+def lazy_view(view_path, **initkwargs):
+    '''
+    Returns view which imports class based view at `view_path` on its first request,
+    so modules used only by rarely hit views (e.g. schema generation) are not imported at startup.
+    '''
+    view = None
+
+    # Class based views of DRF are csrf exempt, CsrfViewMiddleware checks the outer view
+    @csrf_exempt
+    def lazy(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(view_path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+
+    return lazy
+
+
+# Users endpoints of djoser, routed by core.urls without reading `schema` at startup
+class UserViewSet(LazySchemaMixin, BaseUserViewSet):
+    pass
+
+
+live_schema_view = lazy_view('drf_spectacular.views.SpectacularAPIView')
+
+
+@require_safe
+def schema_view(request):
+    '''
+    Serves OpenAPI schema precomputed by `manage.py generate_schema` from SCHEMA_ROOT.
+    Clients revalidate it with ETag and get 304 until the schema is regenerated.
+    In DEBUG the schema is generated on each request, so it follows code changes.
+    '''
+    if settings.DEBUG:
+        return live_schema_view(request)
+
+    filename, content_type = SCHEMA_FILES[get_schema_format(request)]
+    path = os.path.join(settings.SCHEMA_ROOT, filename)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('Schema is not generated, run `manage.py generate_schema`')
+
+    etag = get_file_etag(path, stat.st_mtime_ns, stat.st_size)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        # Sent with sendfile where the server supports it
+        response = FileResponse(open(path, 'rb'), content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -10,6 +10,14 @@ python3 manage.py migrate         # migrate package migrations
 # collect static files
 python3 manage.py collectstatic --noinput
 
+# generate OpenAPI schema served at /doc/yml
+python3 manage.py generate_schema
+
 # Start server with gunicorn workers
+# SERVER=uvicorn runs ASGI workers, required for non blocking /api/async/ endpoints
 echo "Starting server"
-gunicorn --bind :8000 --workers 3 medical_rec.wsgi:application
+if [ "$SERVER" = "uvicorn" ]; then
+    gunicorn --bind :8000 --workers ${WEB_WORKERS:-3} --worker-class uvicorn.workers.UvicornWorker medical_rec.asgi:application
+else
+    gunicorn --bind :8000 --workers ${WEB_WORKERS:-3} medical_rec.wsgi:application
+fi
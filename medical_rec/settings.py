@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
+import tempfile
 from environs import Env
 
 env = Env()
@@ -38,19 +40,25 @@ if DEBUG:
     ALLOWED_HOSTS += ['localhost', '127.0.0.1']
     INTERNAL_IPS = ["127.0.0.1"] + env.list('HOSTS')
 
+# Debug toolbar and admin are left out of apps, middlewares and urls unless enabled,
+# so production workers neither import them nor run their hooks on every request
+DEBUG_TOOLBAR = env.bool('DEBUG_TOOLBAR', DEBUG)
+ADMIN_ENABLED = env.bool('ADMIN_ENABLED', DEBUG)
+
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    *(['django.contrib.admin'] if ADMIN_ENABLED else []),
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'django_filters',
     'djoser',
-    'debug_toolbar',
+    *(['debug_toolbar'] if DEBUG_TOOLBAR else []),
     'drf_spectacular',
     'corsheaders',
     'core',
@@ -59,7 +67,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
+    'core.middleware.CompressionMiddleware',
+    *(['debug_toolbar.middleware.DebugToolbarMiddleware'] if DEBUG_TOOLBAR else []),
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -105,6 +114,32 @@ DATABASES = {
 }
 
 
+# Max requests of an ASGI worker using database connections at once (api.async_views)
+ASYNC_DB_CONCURRENCY = env.int('ASYNC_DB_CONCURRENCY', 20)
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# File based cache is shared by all workers of a host. Local memory cache is per process
+# and suits only single process deployments.
+
+CACHES = {
+    'default': {
+        'BACKEND': env.str('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': env.str('CACHE_LOCATION', str(Path(tempfile.gettempdir()) / 'medical_rec_cache')),
+        # Sized for list pages of every doctor, with Django's default of 300 entries pages of
+        # active doctors evict each other. A full cache drops 1/CULL_FREQUENCY of its entries.
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('CACHE_MAX_ENTRIES', 10000),
+            'CULL_FREQUENCY': env.int('CACHE_CULL_FREQUENCY', 4),
+        },
+    }
+}
+
+# Seconds to keep cached patient list pages, 0 disables the cache
+PATIENT_LIST_CACHE_TIMEOUT = env.int('PATIENT_LIST_CACHE_TIMEOUT', 300)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -143,10 +178,41 @@ STATIC_URL = 'static/'
 
 STATIC_ROOT = BASE_DIR / 'static/'
 
+# OpenAPI schema files written by `manage.py generate_schema`, also served by nginx under /static/schema/
+SCHEMA_ROOT = STATIC_ROOT / 'schema'
+
 MEDIA_URL = 'media/'
 
 MEDIA_ROOT = BASE_DIR / 'media/'
 
+# Resumable material uploads: bytes per chunk and max file size
+MATERIAL_UPLOAD_CHUNK_SIZE = env.int('MATERIAL_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+MATERIAL_UPLOAD_MAX_SIZE = env.int('MATERIAL_UPLOAD_MAX_SIZE', 10 * 1024 * 1024 * 1024)
+# Hours after start when unfinished uploads and their part files are deleted (manage.py prune_material_uploads)
+MATERIAL_UPLOAD_EXPIRY_HOURS = env.int('MATERIAL_UPLOAD_EXPIRY_HOURS', 72)
+
+# Thumbnails of materials: max width and height in pixels, seconds to render a PDF page
+MATERIAL_THUMBNAIL_SIZE = env.int('MATERIAL_THUMBNAIL_SIZE', 256)
+MATERIAL_PREVIEW_TIMEOUT = env.int('MATERIAL_PREVIEW_TIMEOUT', 60)
+
+# Background jobs (api.jobs): attempts before a job fails and seconds before first retry (doubled after each)
+JOB_MAX_ATTEMPTS = env.int('JOB_MAX_ATTEMPTS', 3)
+JOB_RETRY_DELAY = env.int('JOB_RETRY_DELAY', 30)
+
+# Days tombstones of deleted patients and materials are kept for delta sync (manage.py prune_tombstones)
+TOMBSTONE_RETENTION_DAYS = env.int('TOMBSTONE_RETENTION_DAYS', 90)
+# Seconds delta sync stays behind now. `updated` is set before commit, rows of transactions running
+# longer than this may be committed behind a returned watermark and are not delivered.
+SYNC_SAFETY_LAG = env.int('SYNC_SAFETY_LAG', 60)
+
+# Material downloads are handed off to nginx's internal media location with X-Accel-Redirect
+MATERIAL_ACCEL_REDIRECT = env.bool('MATERIAL_ACCEL_REDIRECT', False)
+
+# Response compression (core.middleware): encodings in preference order, empty disables compression,
+# and min bytes of non streaming bodies worth compressing
+COMPRESSION_ENCODINGS = env.list('COMPRESSION_ENCODINGS', ['zstd', 'br', 'gzip'])
+COMPRESSION_MIN_SIZE = env.int('COMPRESSION_MIN_SIZE', 1024)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -154,15 +220,34 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+# MessagePack is negotiated only when msgpack is installed
+MSGPACK_INSTALLED = find_spec('msgpack') is not None
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.ProfileJWTAuthentication',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        *(['api.renderers.MessagePackRenderer'] if MSGPACK_INSTALLED else []),
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        *(['api.parsers.MessagePackParser'] if MSGPACK_INSTALLED else []),
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CountedPageNumberPagination',
     'PAGE_SIZE': 50,
+    # Reading `schema` of a view instantiates this class, so drf_spectacular would be imported by
+    # routers at startup. Viewsets use core.schemas.LazySchemaMixin to collect actions without it.
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Rows per INSERT/UPDATE statement of bulk endpoints
+BULK_BATCH_SIZE = env.int('BULK_BATCH_SIZE', 1000)
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'MedicalRec',
     'DESCRIPTION': "RESTful service that allows doctors and medical professionals to access and update a patient's medical history.",
@@ -174,8 +259,16 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("JWT",),
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=env.float("JWT_ACCESS_TOKEN_LIFETIME", 0.5)),
     "REFRESH_TOKEN_LIFETIME": timedelta(hours=env.float("JWT_REFRESH_TOKEN_LIFETIME", 24)),
+    "TOKEN_OBTAIN_SERIALIZER": "core.serializers.TokenObtainPairSerializer",
 }
 
+# Trust claims of access tokens on api endpoints without querying users (core.authentication)
+JWT_STATELESS = env.bool('JWT_STATELESS', False)
+
+# Seconds authenticated users stay in per process cache (core.authentication), 0 disables the cache
+AUTH_USER_CACHE_TIMEOUT = env.float('AUTH_USER_CACHE_TIMEOUT', 0)
+AUTH_USER_CACHE_SIZE = env.int('AUTH_USER_CACHE_SIZE', 1024)
+
 DJOSER = {
     'PASSWORD_RESET_CONFIRM_URL': env.str("FRONTEND_PASSWORD_RESET_CONFIRM_URL", ""),
     'USERNAME_RESET_CONFIRM_URL': env.str("FRONTEND_USERNAME_RESET_CONFIRM_URL", ""),
@@ -17,21 +17,22 @@ Including another URLconf
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+
+from core.views import lazy_view, schema_view
 
 urlpatterns = [
     # App urls
     path('api/', include('api.urls')),
     # Auth
-    path('auth/', include('djoser.urls')),
-    path('auth/', include('djoser.urls.jwt')),
-    # Documentation
-    path('doc/yml', SpectacularAPIView.as_view(), name='schema'),
-    path('doc/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('doc/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    path('auth/', include('core.urls')),
+    # Documentation, schema is precomputed and drf_spectacular views are imported on first request
+    path('doc/yml', schema_view, name='schema'),
+    path('doc/swagger-ui/', lazy_view('drf_spectacular.views.SpectacularSwaggerView', url_name='schema'), name='swagger-ui'),
+    path('doc/redoc/', lazy_view('drf_spectacular.views.SpectacularRedocView', url_name='schema'), name='redoc'),
 ]
 
-if settings.DEBUG:
+if settings.DEBUG_TOOLBAR:
     urlpatterns += [path('__debug__/', include('debug_toolbar.urls'))]
+
+if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file